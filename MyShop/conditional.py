@@ -0,0 +1,45 @@
+"""
+Helpers for conditional GET (ETag / Last-Modified) on API views.
+
+Validators are derived from cheap state such as version counters and
+`updated_at` timestamps, so a 304 can be returned before anything is
+serialized.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """
+    Build a strong ETag from the given state values
+    """
+    raw = ':'.join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def not_modified_response(request, etag=None, last_modified=None):
+    """
+    Return a 304 Not Modified response if the client's copy is still
+    current, otherwise None
+    """
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """
+    Attach ETag / Last-Modified headers to a response
+    """
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
@@ -0,0 +1,125 @@
+"""
+Idempotency-Key support for unsafe API views.
+
+The first request with a given key runs the view and its response is kept
+in the cache for IDEMPOTENCY_KEY_TTL seconds. Retries with the same key get
+the stored response back without running the view again; retries arriving
+while the first request is still running wait for its result. Keys are
+scoped per view and per user, and reusing a key with a different request
+body is rejected.
+
+The store is the Django cache, so all processes must share one (e.g. Redis)
+for the guarantee to hold across workers.
+"""
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from drf_yasg import openapi
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENCY_KEY_PARAMETER = openapi.Parameter(
+    IDEMPOTENCY_HEADER, openapi.IN_HEADER, type=openapi.TYPE_STRING, required=False,
+    description='Unique key for this operation; retries with the same key replay the first response',
+)
+
+
+def get_store():
+    return caches[getattr(settings, 'IDEMPOTENCY_CACHE', 'default')]
+
+
+def store_key(scope, user_id, key):
+    return f'idempotency:{scope}:{user_id}:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def request_fingerprint(request):
+    return hashlib.md5(json.dumps(request.data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def wait_for_result(store, cache_key):
+    """
+    Poll the store until the in-flight request with this key finished, or give up
+    """
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 30)
+    while time.monotonic() < deadline:
+        entry = store.get(cache_key)
+        if entry is None or entry['state'] == 'done':
+            return entry
+        time.sleep(0.05)
+    return store.get(cache_key)
+
+
+def replay(entry):
+    response = Response(entry['data'], status=entry['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """
+    Honour the Idempotency-Key header on the decorated view.
+    Apply it below @api_view so the request is already authenticated.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if key is None:
+                return view(request, *args, **kwargs)
+            if not key.strip() or len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {"detail": f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters long."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            store = get_store()
+            cache_key = store_key(scope, request.user.pk, key)
+            fingerprint = request_fingerprint(request)
+            ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+            pending = {'state': 'pending', 'fingerprint': fingerprint}
+
+            # cache.add is atomic: only one request claims the key, duplicates wait for its result
+            while not store.add(cache_key, pending, timeout=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60)):
+                entry = store.get(cache_key)
+                if entry is not None and entry['fingerprint'] != fingerprint:
+                    return Response(
+                        {"detail": f"This {IDEMPOTENCY_HEADER} was already used with a different request."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if entry is not None and entry['state'] == 'pending':
+                    entry = wait_for_result(store, cache_key)
+                if entry is None:
+                    # The first request failed or its claim expired; try to claim the key again
+                    continue
+                if entry['state'] == 'done':
+                    return replay(entry)
+                return Response(
+                    {"detail": f"A request with this {IDEMPOTENCY_HEADER} is still being processed."},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                store.delete(cache_key)
+                raise
+            if response.status_code >= 500:
+                # Server errors are not final, let a retry run the view again
+                store.delete(cache_key)
+            else:
+                store.set(cache_key, {
+                    'state': 'done',
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                }, timeout=ttl)
+            return response
+        return wrapper
+    return decorator
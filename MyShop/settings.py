@@ -95,6 +95,57 @@ DATABASES = {
 }
 
 
+# Cache
+# Local-memory cache by default; production should point this at a shared
+# backend (e.g. Redis or Memcached) so all workers see the same catalog version.
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'myshop',
+    }
+}
+
+# Seconds a cached catalog listing is kept (entries are also invalidated by catalog changes)
+CATALOG_CACHE_TIMEOUT = 300
+
+# Seconds a rendered cart is kept (entries are also invalidated by cart mutations)
+CART_CACHE_TIMEOUT = 300
+
+# Where cart contents are kept: 'cart.storage.DatabaseCartStorage' writes every change to the
+# database, 'cart.storage.CacheCartStorage' keeps carts in the cache (use a shared cache such as
+# Redis in production) and writes them to the database at checkout or via `manage.py flush_carts`
+CART_STORAGE = 'cart.storage.DatabaseCartStorage'
+
+# CacheCartStorage per-cart lock: seconds before a held lock expires and seconds a request waits for it
+CART_LOCK_TIMEOUT = 10
+CART_LOCK_WAIT_TIMEOUT = 5
+
+# Background workers and carts per UPDATE used to reprice carts after product price changes
+CART_REPRICING_WORKERS = 1
+CART_REPRICING_CHUNK_SIZE = 1000
+
+# Background jobs (orders.jobs, run by `manage.py run_jobs`): attempts per job, first retry
+# delay in seconds (doubled per attempt, capped) and seconds before a silent worker's job is reclaimed
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 10
+JOB_RETRY_BACKOFF_MAX = 3600
+JOB_LOCK_TIMEOUT = 300
+
+# Idempotency-Key handling (MyShop.idempotency): seconds a response is kept for replays, seconds
+# a claim on an in-flight key lasts, and seconds a duplicate waits for the first request's result.
+# Responses are kept in the default cache, which must be shared by all processes in production.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+IDEMPOTENCY_WAIT_TIMEOUT = 30
+
+# Age in days after which finished orders and transactions are moved to the archive tables
+# (`manage.py archive_orders` / `manage.py archive_transactions`)
+ARCHIVE_ORDERS_AFTER_DAYS = 365
+ARCHIVE_TRANSACTIONS_AFTER_DAYS = 365
+
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -209,3 +260,6 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Media settings: store uploaded images in the products/media/ directory.
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'products', 'media')
+
+# Number of worker threads generating product image derivatives (thumbnails, WebP)
+PRODUCT_IMAGE_WORKERS = 2
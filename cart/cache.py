@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from products.cache import get_catalog_version
+from .models import Cart, CartItem
+
+
+def cart_state(cart):
+    """
+    Values that change whenever the rendered cart changes: every item write
+    bumps the cart's updated_at, and the items embed product details
+    """
+    return ('cart', cart.id, cart.updated_at.isoformat(), get_catalog_version())
+
+
+def rendered_cart_key(cart):
+    return 'cart:rendered:' + ':'.join(str(part) for part in cart_state(cart))
+
+
+def get_rendered_cart(cart):
+    return cache.get(rendered_cart_key(cart))
+
+
+def set_rendered_cart(cart, data):
+    cache.set(rendered_cart_key(cart), data, timeout=getattr(settings, 'CART_CACHE_TIMEOUT', 300))
+
+
+def load_cart_for_render(cart_id):
+    """
+    Load a cart with its items and their products in two queries
+    """
+    return Cart.objects.prefetch_related(
+        Prefetch('items', queryset=CartItem.objects.select_related('product').order_by('id'))
+    ).get(pk=cart_id)
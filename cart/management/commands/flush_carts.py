@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cart.storage import get_cart_storage
+
+
+class Command(BaseCommand):
+    help = 'Write carts changed in the cart storage since the last run to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Keep running and flush every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        storage = get_cart_storage()
+        while True:
+            flushed = storage.flush_pending()
+            self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} carts.'))
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from cart.models import Cart
+from cart.repricing import reprice_carts
+
+
+class Command(BaseCommand):
+    help = 'Recompute every cart total from its items (repairs totals that drifted)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of carts updated per statement')
+        parser.add_argument('--product', type=int, action='append', dest='products', default=[],
+                            help='Only reprice carts containing this product (repeatable)')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if options['products']:
+            updated = reprice_carts(options['products'], chunk_size=chunk_size)
+            self.stdout.write(self.style.SUCCESS(f'Reconciled {updated} carts.'))
+            return
+
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                Cart.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            updated += Cart.reconcile_totals(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {updated} carts.'))
@@ -1,29 +1,71 @@
 from django.db import models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
 from products.models import Product
 from decimal import Decimal
 
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="cart")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Cart of {self.user.username}"
     
+    @staticmethod
+    def total_expression():
+        """
+        SQL expression computing a cart's total from its items and current product prices
+        """
+        line_totals = CartItem.objects.filter(cart=OuterRef('pk')).values('cart').annotate(
+            total=Sum(F('quantity') * F('product__price'), output_field=DecimalField(max_digits=10, decimal_places=2))
+        ).values('total')
+        return Coalesce(
+            Subquery(line_totals, output_field=DecimalField(max_digits=10, decimal_places=2)),
+            Value(Decimal('0.00')),
+        )
+    
+    @classmethod
+    def reconcile_totals(cls, carts):
+        """
+        Recompute the totals of the given carts (queryset or ids) with a single UPDATE
+        """
+        if not isinstance(carts, models.QuerySet):
+            carts = cls.objects.filter(pk__in=carts)
+        return carts.update(total_amount=cls.total_expression(), updated_at=timezone.now())
+    
     def update_total(self):
         """
-        Calculate and update the total amount of the cart
+        Full reconciliation of the cart total from all its items.
+        Item writes keep the total up to date incrementally, this repairs drift.
+        """
+        Cart.reconcile_totals(Cart.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=['total_amount', 'updated_at'])
+        return self.total_amount
+    
+    @classmethod
+    def apply_total_delta(cls, cart_id, amount):
+        """
+        Add amount (may be negative) to a cart total with a single UPDATE
         """
-        total = Decimal('0.00')
-        cart_items = self.items.all()
-        for item in cart_items:
-            total += item.product.price * item.quantity
-        
-        self.total_amount = total
-        self.save()
-        return total
+        cls.objects.filter(pk=cart_id).update(
+            total_amount=F('total_amount') + amount, updated_at=timezone.now()
+        )
 
 class CartItem(models.Model):
+
+    class Meta:
+        # Walk the carts containing a product in cart order when repricing (see cart.repricing)
+        indexes = [
+            models.Index(fields=['product', 'cart'], name='cartitem_product_cart_idx'),
+        ]
+        # One line per product, so concurrent adds increment the same row (see cart.operations)
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='cartitem_unique_cart_product'),
+        ]
+
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
@@ -31,17 +73,46 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in {self.cart.user.username}'s cart"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored quantity so saves only apply the change to the cart total
+        instance._saved_quantity = instance.__dict__.get('quantity')
+        return instance
+    
+    def _line_amount(self, quantity):
+        if 'product' in self._state.fields_cache:
+            return self.product.price * quantity
+        # Let the database multiply so the product does not have to be loaded
+        price = Product.objects.filter(pk=self.product_id).values('price')[:1]
+        return Subquery(price, output_field=models.DecimalField(max_digits=10, decimal_places=2)) * quantity
+    
+    def _apply_to_cart_total(self, quantity_delta):
+        if not quantity_delta:
+            return
+        amount = self._line_amount(quantity_delta)
+        Cart.apply_total_delta(self.cart_id, amount)
+        # Keep an already loaded cart in sync without another query
+        if 'cart' in self._state.fields_cache and not hasattr(amount, 'resolve_expression'):
+            self.cart.total_amount += amount
+    
     def save(self, *args, **kwargs):
         """
-        Override save method to update cart total when cart item changes
+        Override save method to apply the quantity change to the cart total (O(1) queries)
         """
+        saved_quantity = getattr(self, '_saved_quantity', None) or 0
         super().save(*args, **kwargs)
-        self.cart.update_total()
+        self._apply_to_cart_total(self.quantity - saved_quantity)
+        self._saved_quantity = self.quantity
     
     def delete(self, *args, **kwargs):
         """
-        Override delete method to update cart total when cart item is removed
+        Override delete method to subtract the removed line from the cart total
         """
-        cart = self.cart
-        super().delete(*args, **kwargs)
-        cart.update_total()
+        saved_quantity = getattr(self, '_saved_quantity', None)
+        if saved_quantity is None:
+            saved_quantity = self.quantity
+        result = super().delete(*args, **kwargs)
+        self._apply_to_cart_total(-saved_quantity)
+        self._saved_quantity = 0
+        return result
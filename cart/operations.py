@@ -0,0 +1,159 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery
+
+from products.models import Product
+from .models import Cart, CartItem
+
+
+class CartOperationError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class CartItemError(Exception):
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def resolve_quantities(current, operations):
+    """
+    Apply set/increment/remove operations, in order, to a {product_id: quantity} mapping
+    """
+    quantities = dict(current)
+    for operation in operations:
+        product_id = operation['product_id']
+        if operation['action'] == 'remove':
+            quantities[product_id] = 0
+        elif operation['action'] == 'increment':
+            quantities[product_id] = quantities.get(product_id, 0) + operation['quantity']
+        else:
+            quantities[product_id] = operation['quantity']
+    return quantities
+
+
+def check_stock(quantities):
+    """
+    Check every positive quantity against product stock with one query
+    """
+    wanted = [product_id for product_id, quantity in quantities.items() if quantity > 0]
+    products = Product.objects.only('id', 'name', 'stock').in_bulk(wanted)
+    
+    errors = []
+    for product_id in wanted:
+        product = products.get(product_id)
+        if product is None:
+            errors.append({'product_id': product_id, 'detail': 'Product not found.'})
+        elif quantities[product_id] > product.stock:
+            errors.append({
+                'product_id': product_id,
+                'detail': f"Only {product.stock} units of '{product.name}' available.",
+            })
+    if errors:
+        raise CartOperationError(errors)
+
+
+def check_item_stock(product, current_quantity, quantity):
+    """
+    Check that quantity more units of product fit next to the ones already in the cart
+    """
+    if current_quantity + quantity > product.stock:
+        available = product.stock - current_quantity
+        if available <= 0:
+            raise CartItemError(f"Product '{product.name}' is out of stock.")
+        raise CartItemError(
+            f"Cannot add {quantity} more units of '{product.name}'. Only {available} more units available."
+        )
+
+
+def increment_cart_item(cart, product, quantity):
+    """
+    Atomically add quantity units of product to the cart without exceeding stock.
+
+    An existing line is incremented with one conditional UPDATE that checks
+    stock in the same statement. Otherwise the line is inserted; if a
+    concurrent request inserted it first, the unique (cart, product)
+    constraint rejects the insert and the increment is retried.
+    Raises CartItemError when stock does not allow the increment.
+
+    The stock check is a correlated subquery on the updated row itself, not a
+    join: PostgreSQL re-evaluates the row's own conditions after waiting for a
+    concurrent update of it, so the quantity compared is always the latest one.
+    """
+    product_stock = Product.objects.filter(pk=OuterRef('product_id')).values('stock')
+    for attempt in range(2):
+        with transaction.atomic():
+            updated = CartItem.objects.filter(
+                cart_id=cart.pk, product_id=product.pk, quantity__lte=Subquery(product_stock) - quantity,
+            ).update(quantity=F('quantity') + quantity)
+            if updated:
+                # Queryset updates bypass CartItem.save, so apply the change to the total here
+                Cart.apply_total_delta(cart.pk, product.price * quantity)
+                return
+        if attempt or quantity > product.stock:
+            break
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+            return
+        except IntegrityError:
+            continue
+    
+    current = CartItem.objects.filter(cart=cart, product=product).values_list('quantity', flat=True).first()
+    check_item_stock(product, current or 0, quantity)
+    # Stock changed between the statements; report the line as full
+    raise CartItemError(f"Product '{product.name}' is out of stock.")
+
+
+def write_cart_items(cart, quantities, items=None):
+    """
+    Bring the cart's items to the given {product_id: quantity} mapping (0 removes)
+    with one bulk_create, one bulk_update and one delete, then recompute the
+    total with a single UPDATE.
+    """
+    if items is None:
+        items = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+    
+    to_create, to_update, to_delete = [], [], []
+    for product_id, quantity in quantities.items():
+        item = items.get(product_id)
+        if item is None:
+            if quantity > 0:
+                to_create.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+        elif quantity == 0:
+            to_delete.append(item.pk)
+        elif quantity != item.quantity:
+            item.quantity = quantity
+            to_update.append(item)
+    
+    # Bulk writes bypass CartItem.save/delete, so the total is reconciled once at the end
+    CartItem.objects.bulk_create(to_create)
+    CartItem.objects.bulk_update(to_update, ['quantity'])
+    if to_delete:
+        CartItem.objects.filter(pk__in=to_delete).delete()
+    if to_create or to_update or to_delete:
+        Cart.reconcile_totals(Cart.objects.filter(pk=cart.pk))
+    return bool(to_create or to_update or to_delete)
+
+
+@transaction.atomic
+def apply_cart_operations(user, operations):
+    """
+    Apply a batch of validated item operations to the user's cart.
+
+    The cart row is locked so concurrent batches apply one after the other.
+    Products are loaded and stock is checked with one query, and nothing is
+    written unless every operation is valid.
+    """
+    cart, _ = Cart.objects.get_or_create(user=user)
+    cart = Cart.objects.select_for_update().get(pk=cart.pk)
+    
+    items = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+    quantities = resolve_quantities(
+        {product_id: item.quantity for product_id, item in items.items()}, operations
+    )
+    check_stock(quantities)
+    write_cart_items(cart, quantities, items)
+    return cart
@@ -0,0 +1,69 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+from products.signals import product_prices_changed
+from .models import Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    """
+    Return the worker pool that reprices carts off the request path
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CART_REPRICING_WORKERS', 1),
+                thread_name_prefix='cart-repricing',
+            )
+    return _executor
+
+
+def reprice_carts(product_ids, chunk_size=1000):
+    """
+    Recompute the totals of every cart containing one of the products.
+
+    Carts are walked in cart id order through the (product, cart) index and
+    each chunk is repriced with one set-based UPDATE, so a product sitting
+    in any number of carts never loads them into Python or holds long locks.
+    """
+    last_cart_id = 0
+    repriced = 0
+    while True:
+        cart_ids = list(
+            CartItem.objects.filter(product_id__in=product_ids, cart_id__gt=last_cart_id)
+            .order_by('cart_id').values_list('cart_id', flat=True).distinct()[:chunk_size]
+        )
+        if not cart_ids:
+            break
+        repriced += Cart.reconcile_totals(cart_ids)
+        last_cart_id = cart_ids[-1]
+    return repriced
+
+
+def run_repricing(product_ids):
+    close_old_connections()
+    try:
+        reprice_carts(product_ids, chunk_size=getattr(settings, 'CART_REPRICING_CHUNK_SIZE', 1000))
+    except Exception:
+        logger.exception('Repricing carts for products %s failed', product_ids)
+    finally:
+        close_old_connections()
+
+
+@receiver(product_prices_changed)
+def schedule_cart_repricing(sender, product_ids, **kwargs):
+    """
+    Reprice affected carts in the background once a price change has committed
+    """
+    get_executor().submit(run_repricing, product_ids)
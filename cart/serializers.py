@@ -1,11 +1,11 @@
 from rest_framework import serializers
 from .models import Cart, CartItem
 from products.models import Product
-from products.serializers import ProductSerializer  # To display product details
+from products.serializers import ProductReadSerializer  # To display product details
 
 class CartItemSerializer(serializers.ModelSerializer):
-    # Display product details in GET responses.
-    product = ProductSerializer(read_only=True)
+    # Display product details in GET responses (fast read-only path).
+    product = ProductReadSerializer(read_only=True)
     # For POST/PUT, accept a product ID.
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), source='product', write_only=True
@@ -26,3 +26,18 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = ['id', 'user', 'items', 'total_amount']
         read_only_fields = ['user', 'total_amount']
+
+CART_ITEM_ACTIONS = ('set', 'increment', 'remove')
+
+class CartItemOperationSerializer(serializers.Serializer):
+    # One entry of a batch cart update; products are resolved in bulk, not per entry
+    product_id = serializers.IntegerField(min_value=1)
+    action = serializers.ChoiceField(choices=CART_ITEM_ACTIONS, default='set')
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    
+    def validate(self, attrs):
+        if attrs['action'] != 'remove' and 'quantity' not in attrs:
+            raise serializers.ValidationError({'quantity': ['This field is required.']})
+        if attrs['action'] == 'increment' and attrs['quantity'] == 0:
+            raise serializers.ValidationError({'quantity': ['Must be greater than zero.']})
+        return attrs
@@ -0,0 +1,315 @@
+"""
+Cart storage backends, selected with the CART_STORAGE setting.
+
+DatabaseCartStorage keeps carts in the Cart/CartItem tables. CacheCartStorage
+keeps cart contents in the cache and writes them behind to those tables at
+checkout or when the flush_carts command runs, so browsing does not write to
+the database. Orders are always created from the database cart, after a flush.
+"""
+import contextlib
+import functools
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from products.cache import get_catalog_version, get_products_by_ids
+from products.models import Product
+from .cache import cart_state, get_rendered_cart, set_rendered_cart, load_cart_for_render
+from .models import Cart, CartItem
+from .operations import (
+    CartItemError, apply_cart_operations, check_item_stock, check_stock, increment_cart_item, resolve_quantities,
+    write_cart_items,
+)
+from .serializers import CartSerializer, CartItemSerializer
+
+
+class CartSnapshot:
+    """
+    A loaded cart: state identifies its current contents (for ETags and
+    caching) and render() builds the CartSerializer representation.
+    """
+
+    def __init__(self, state, updated_at, render):
+        self.state = state
+        self.updated_at = updated_at
+        self._render = render
+
+    def render(self):
+        return self._render()
+
+
+class DatabaseCartStorage:
+    """
+    Every cart change is written to the database immediately
+    """
+
+    def snapshot(self, user):
+        try:
+            cart = Cart.objects.get(user=user)
+        except Cart.DoesNotExist:
+            return None
+        return CartSnapshot(cart_state(cart), cart.updated_at, lambda: self._render(cart))
+
+    def _render(self, cart):
+        data = get_rendered_cart(cart)
+        if data is None:
+            data = CartSerializer(load_cart_for_render(cart.id)).data
+            set_rendered_cart(cart, data)
+        return data
+
+    def add_item(self, user, product_id, quantity):
+        try:
+            product = Product.objects.get(id=product_id)
+        except Product.DoesNotExist:
+            raise CartItemError("Product not found.", status_code=404)
+
+        cart, created = Cart.objects.get_or_create(user=user)
+        increment_cart_item(cart, product, quantity)
+        cart_item = CartItem.objects.get(cart=cart, product=product)
+        cart_item.product = product
+        return CartItemSerializer(cart_item).data
+
+    def remove_item(self, user, item_id):
+        try:
+            cart_item = CartItem.objects.get(cart__user=user, id=item_id)
+        except CartItem.DoesNotExist:
+            return False
+        cart_item.delete()
+        return True
+
+    def apply_operations(self, user, operations):
+        cart = apply_cart_operations(user, operations)
+        return CartSerializer(load_cart_for_render(cart.id)).data
+
+    def flush(self, user):
+        """
+        Return the user's database cart with all pending changes written, or None
+        """
+        return Cart.objects.filter(user=user).first()
+
+    def flush_pending(self):
+        return 0
+
+    def discard(self, user, ordered):
+        """
+        Drop the ordered {product_id: quantity} lines from cart contents kept
+        outside the database (after checkout emptied the database cart)
+        """
+
+
+class CacheCartStorage:
+    """
+    Cart contents live in the cache as {product_id: quantity}; cart item ids
+    are the product ids. Changed carts are registered in a dirty list that
+    flush_pending() (the flush_carts command) writes behind to the database.
+    Every read-modify-write of a cart holds a per-cart lock taken with
+    cache.add, so concurrent changes to one cart apply one after the other.
+
+    Use a cache shared by all processes (e.g. Redis or Memcached) in
+    production; the local-memory cache only works for a single process.
+    """
+    key_prefix = 'cart:state:'
+    dirty_seq_key = 'cart:dirty:seq'
+    dirty_flushed_key = 'cart:dirty:flushed'
+    lock_prefix = 'cart:lock:'
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'CART_STORAGE_CACHE', 'default')]
+
+    def _key(self, user_id):
+        return f'{self.key_prefix}{user_id}'
+
+    @contextlib.contextmanager
+    def _locked(self, user_id):
+        """
+        Hold the cart's lock; raises CartItemError (409) if it stays taken
+        """
+        lock_key = f'{self.lock_prefix}{user_id}'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + getattr(settings, 'CART_LOCK_WAIT_TIMEOUT', 5)
+        # The lock expires on its own if its holder dies
+        while not self.cache.add(lock_key, token, timeout=getattr(settings, 'CART_LOCK_TIMEOUT', 10)):
+            if time.monotonic() >= deadline:
+                raise CartItemError("The cart is being updated by another request. Please try again.", status_code=409)
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            if self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+
+    def _load(self, user_id, create=True):
+        state = self.cache.get(self._key(user_id))
+        if state is None:
+            # Read through to the persisted cart the first time
+            cart = Cart.objects.filter(user_id=user_id).first()
+            if cart is None and not create:
+                return None
+            lines = {}
+            if cart is not None:
+                lines = dict(CartItem.objects.filter(cart=cart).order_by('id').values_list('product_id', 'quantity'))
+            state = {
+                'cart_id': cart.id if cart else None,
+                'lines': lines,
+                'updated_at': cart.updated_at if cart else timezone.now(),
+                'dirty': False,
+            }
+            self.cache.set(self._key(user_id), state, timeout=None)
+        return state
+
+    def _save(self, user_id, state):
+        state['updated_at'] = timezone.now()
+        if not state['dirty']:
+            state['dirty'] = True
+            self._mark_dirty(user_id)
+        self.cache.set(self._key(user_id), state, timeout=None)
+
+    def _mark_dirty(self, user_id):
+        # incr is atomic on shared caches, so concurrent registrations never collide
+        self.cache.add(self.dirty_seq_key, 0, timeout=None)
+        seq = self.cache.incr(self.dirty_seq_key)
+        self.cache.set(f'cart:dirty:{seq}', user_id, timeout=None)
+
+    def snapshot(self, user):
+        state = self._load(user.pk, create=False)
+        if state is None:
+            return None
+        cart_key = ('cart', 'cached', user.pk, state['updated_at'].isoformat(), get_catalog_version())
+        return CartSnapshot(cart_key, state['updated_at'], lambda: self._render(user.pk, state))
+
+    def _render(self, user_id, state):
+        products = get_products_by_ids(list(state['lines']))
+        items = []
+        total = Decimal('0.00')
+        for product_id, quantity in state['lines'].items():
+            product = products.get(product_id)
+            if product is None:
+                continue
+            items.append({'id': product_id, 'product': product, 'quantity': quantity})
+            total += Decimal(product['price']) * quantity
+        return {
+            'id': state['cart_id'],
+            'user': user_id,
+            'items': items,
+            'total_amount': str(total.quantize(Decimal('0.01'))),
+        }
+
+    def add_item(self, user, product_id, quantity):
+        try:
+            product = Product.objects.only('id', 'name', 'stock').get(id=product_id)
+        except Product.DoesNotExist:
+            raise CartItemError("Product not found.", status_code=404)
+
+        with self._locked(user.pk):
+            state = self._load(user.pk)
+            current = state['lines'].get(product.id, 0)
+            check_item_stock(product, current, quantity)
+            state['lines'][product.id] = current + quantity
+            self._save(user.pk, state)
+        return {
+            'id': product.id,
+            'product': get_products_by_ids([product.id]).get(product.id),
+            'quantity': current + quantity,
+        }
+
+    def remove_item(self, user, item_id):
+        with self._locked(user.pk):
+            state = self._load(user.pk)
+            if state['lines'].pop(item_id, None) is None:
+                return False
+            self._save(user.pk, state)
+        return True
+
+    def apply_operations(self, user, operations):
+        with self._locked(user.pk):
+            state = self._load(user.pk)
+            quantities = resolve_quantities(state['lines'], operations)
+            check_stock(quantities)
+            state['lines'] = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+            self._save(user.pk, state)
+        return self._render(user.pk, state)
+
+    def flush(self, user):
+        return self._flush(user.pk)
+
+    def _flush(self, user_id):
+        state = self.cache.get(self._key(user_id))
+        if state is None or not state['dirty']:
+            return Cart.objects.filter(user_id=user_id).first()
+
+        with transaction.atomic():
+            cart, _ = Cart.objects.get_or_create(user_id=user_id)
+            cart = Cart.objects.select_for_update().get(pk=cart.pk)
+            items = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+            # Products deleted since they were added are dropped
+            existing = set(Product.objects.filter(id__in=list(state['lines'])).values_list('id', flat=True))
+            quantities = {product_id: 0 for product_id in items}
+            quantities.update(
+                (product_id, quantity) for product_id, quantity in state['lines'].items() if product_id in existing
+            )
+            write_cart_items(cart, quantities, items)
+            cart.refresh_from_db(fields=['total_amount', 'updated_at'])
+
+        # Only mark the cart clean if it did not change while being written,
+        # otherwise register it again so the next run writes the newer contents
+        with self._locked(user_id):
+            current = self.cache.get(self._key(user_id))
+            if current is not None and current['updated_at'] == state['updated_at']:
+                current['cart_id'] = cart.id
+                current['dirty'] = False
+                self.cache.set(self._key(user_id), current, timeout=None)
+            elif current is not None and current['dirty']:
+                current['cart_id'] = cart.id
+                self.cache.set(self._key(user_id), current, timeout=None)
+                self._mark_dirty(user_id)
+        return cart
+
+    def flush_pending(self):
+        """
+        Write every cart changed since the last run to the database
+        """
+        start = self.cache.get(self.dirty_flushed_key, 0)
+        end = self.cache.get(self.dirty_seq_key, 0)
+        if end <= start:
+            return 0
+        keys = [f'cart:dirty:{seq}' for seq in range(start + 1, end + 1)]
+        user_ids = set(self.cache.get_many(keys).values())
+        for user_id in user_ids:
+            self._flush(user_id)
+        self.cache.set(self.dirty_flushed_key, end, timeout=None)
+        self.cache.delete_many(keys)
+        return len(user_ids)
+
+    def discard(self, user, ordered):
+        # Only the ordered quantities are removed: items added between the
+        # flush and the commit stay in the cart and are written by the next flush
+        with self._locked(user.pk):
+            state = self._load(user.pk)
+            lines = {
+                product_id: quantity - ordered.get(product_id, 0)
+                for product_id, quantity in state['lines'].items()
+                if quantity > ordered.get(product_id, 0)
+            }
+            state.update(lines=lines, updated_at=timezone.now())
+            if lines and not state['dirty']:
+                state['dirty'] = True
+                self._mark_dirty(user.pk)
+            elif not lines:
+                state['dirty'] = False
+            self.cache.set(self._key(user.pk), state, timeout=None)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_storage(path):
+    return import_string(path)()
+
+
+def get_cart_storage():
+    return _load_storage(getattr(settings, 'CART_STORAGE', 'cart.storage.DatabaseCartStorage'))
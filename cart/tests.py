@@ -1,3 +1,201 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from products.models import Category, Product
+from .models import Cart, CartItem
+from .operations import CartItemError
+from .repricing import reprice_carts
+from .storage import CacheCartStorage, DatabaseCartStorage, write_cart_items
+
+
+def run_in_threads(function, count):
+    """
+    Call function(i) for i in range(count) from count threads, each with its own connection
+    """
+    def target(i):
+        try:
+            return function(i)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        return list(executor.map(target, range(count)))
+
+
+class CartItemsBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Books')
+        self.book = Product.objects.create(name='Book', price=5, category=category, stock=10)
+        self.pen = Product.objects.create(name='Pen', price=2, category=category, stock=3)
+        self.user = User.objects.create_user('buyer', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def patch(self, operations):
+        return self.client.patch('/cart/items/', {'operations': operations}, format='json')
+
+    def lines(self):
+        return dict(CartItem.objects.values_list('product_id', 'quantity'))
+
+    def test_operations_apply_in_order(self):
+        response = self.patch([
+            {'product_id': self.book.id, 'quantity': 2},
+            {'product_id': self.book.id, 'action': 'increment', 'quantity': 3},
+            {'product_id': self.pen.id, 'quantity': 1},
+            {'product_id': self.pen.id, 'action': 'remove'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_amount'], '25.00')
+        self.assertEqual(self.lines(), {self.book.id: 5})
+        self.assertEqual(Cart.objects.get(user=self.user).total_amount, 25)
+
+    def test_invalid_batch_changes_nothing(self):
+        self.patch([{'product_id': self.book.id, 'quantity': 1}])
+        response = self.patch([
+            {'product_id': self.book.id, 'quantity': 4},
+            {'product_id': self.pen.id, 'quantity': 4},
+            {'product_id': 99999, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['product_id'] for error in response.json()['errors']], [self.pen.id, 99999])
+        self.assertEqual(self.lines(), {self.book.id: 1})
+
+    def test_malformed_requests_are_rejected(self):
+        self.assertEqual(self.patch([]).status_code, 400)
+        self.assertEqual(self.patch([{'product_id': self.book.id, 'action': 'double'}]).status_code, 400)
+
+
+class CartRepricingTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Books')
+        self.book = Product.objects.create(name='Book', price=5, category=category, stock=100)
+        self.pen = Product.objects.create(name='Pen', price=2, category=category, stock=100)
+        self.carts = []
+        for i in range(3):
+            cart = Cart.objects.create(user=User.objects.create_user(f'buyer{i}', password='secret'))
+            CartItem.objects.create(cart=cart, product=self.book, quantity=i + 1)
+            CartItem.objects.create(cart=cart, product=self.pen, quantity=1)
+            self.carts.append(cart)
+
+    def totals(self):
+        return list(Cart.objects.order_by('id').values_list('total_amount', flat=True))
+
+    def test_reprice_carts_updates_every_cart_in_chunks(self):
+        Product.objects.filter(pk=self.book.pk).update(price=7)
+        self.assertEqual(reprice_carts([self.book.id], chunk_size=2), 3)
+        self.assertEqual(self.totals(), [9, 16, 23])
+
+    def test_price_change_schedules_repricing_after_commit(self):
+        self.book.price = 6
+        with mock.patch('cart.repricing.get_executor') as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.book.save()
+        get_executor.return_value.submit.assert_called_once_with(mock.ANY, [self.book.id])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs row locking from concurrent connections')
+class CartItemConcurrencyTests(TransactionTestCase):
+    """
+    Many concurrent adds of one product to one cart (a double-clicked button)
+    must neither lose increments nor put more units in the cart than in stock
+    """
+    threads = 20
+
+    def setUp(self):
+        category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(name='Book', price=5, category=category, stock=12)
+        self.user = User.objects.create_user('buyer', password='secret')
+        self.storage = DatabaseCartStorage()
+
+    def add_one(self, i):
+        try:
+            self.storage.add_item(self.user, self.product.id, 1)
+            return True
+        except CartItemError:
+            return False
+
+    def test_concurrent_adds_respect_stock(self):
+        added = sum(run_in_threads(self.add_one, self.threads))
+        item = CartItem.objects.get(product=self.product)
+        self.assertEqual(added, self.product.stock)
+        self.assertEqual(item.quantity, self.product.stock)
+        self.assertEqual(Cart.objects.get(user=self.user).total_amount, item.quantity * self.product.price)
+
+    def test_concurrent_adds_without_stock_limit_are_all_counted(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=1000)
+        added = sum(run_in_threads(self.add_one, self.threads))
+        self.assertEqual(added, self.threads)
+        self.assertEqual(CartItem.objects.get(product=self.product).quantity, self.threads)
+
+
+@override_settings(CART_STORAGE='cart.storage.CacheCartStorage')
+class CacheCartStorageTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(name='Book', price=5, category=category, stock=100)
+        self.other = Product.objects.create(name='Pen', price=2, category=category, stock=100)
+        self.user = User.objects.create_user('buyer', password='secret')
+        self.storage = CacheCartStorage()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_concurrent_adds_are_not_lost(self):
+        run_in_threads(lambda i: self.storage.add_item(self.user, self.product.id, 1), 10)
+        state = self.storage.cache.get(self.storage._key(self.user.pk))
+        self.assertEqual(state['lines'][self.product.id], 10)
+
+    def test_cart_changed_during_flush_stays_queued(self):
+        self.storage.add_item(self.user, self.product.id, 2)
+
+        def write_and_change(*args, **kwargs):
+            changed = write_cart_items(*args, **kwargs)
+            self.storage.add_item(self.user, self.other.id, 1)
+            return changed
+
+        with mock.patch('cart.storage.write_cart_items', side_effect=write_and_change):
+            self.assertEqual(self.storage.flush_pending(), 1)
+        self.assertFalse(CartItem.objects.filter(product=self.other).exists())
+
+        # The change made during the first flush is written by the next one
+        self.assertEqual(self.storage.flush_pending(), 1)
+        self.assertEqual(
+            dict(CartItem.objects.values_list('product_id', 'quantity')),
+            {self.product.id: 2, self.other.id: 1},
+        )
+        self.assertFalse(self.storage.cache.get(self.storage._key(self.user.pk))['dirty'])
+        self.assertEqual(self.storage.flush_pending(), 0)
+
+    def test_discard_keeps_items_added_after_the_flush(self):
+        self.storage.add_item(self.user, self.product.id, 2)
+        self.storage.flush(self.user)
+        # Added while the order is being placed from the flushed cart
+        self.storage.add_item(self.user, self.product.id, 1)
+        self.storage.add_item(self.user, self.other.id, 1)
+        self.storage.discard(self.user, {self.product.id: 2})
+
+        state = self.storage.cache.get(self.storage._key(self.user.pk))
+        self.assertEqual(state['lines'], {self.product.id: 1, self.other.id: 1})
+        self.assertTrue(state['dirty'])
+
+        self.storage.discard(self.user, {self.product.id: 1, self.other.id: 1})
+        state = self.storage.cache.get(self.storage._key(self.user.pk))
+        self.assertEqual(state['lines'], {})
+        self.assertFalse(state['dirty'])
+
+    def test_remove_uses_product_ids_as_item_ids(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.post('/cart/add/', {'product_id': self.product.id, 'quantity': 1}, format='json')
+        item_id = client.get('/cart/view/').json()['items'][0]['id']
+        self.assertEqual(item_id, self.product.id)
+        self.assertEqual(client.delete(f'/cart/remove/{item_id}/').status_code, 204)
+        self.assertEqual(client.get('/cart/view/').json()['items'], [])
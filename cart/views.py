@@ -4,9 +4,14 @@ from rest_framework import status
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.parsers import JSONParser
-from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer
-from products.models import Product
+from .serializers import CartSerializer, CartItemSerializer, CartItemOperationSerializer, CART_ITEM_ACTIONS
+from .operations import CartItemError, CartOperationError
+from .storage import get_cart_storage
+from products.cache import get_catalog_last_modified
+from MyShop.conditional import make_etag, not_modified_response, set_validators
+
+# Upper bound on operations per batch request
+MAX_CART_OPERATIONS = 500
 
 # Add an item to the cart.
 @swagger_auto_schema(
@@ -35,9 +40,6 @@ def add_to_cart(request):
     if user.is_anonymous:
         return Response({"detail": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
 
-    # Retrieve (or create) the user's cart.
-    cart, created = Cart.objects.get_or_create(user=user)
-
     # Validate input data
     product_id = request.data.get('product_id')
     quantity = request.data.get('quantity', 1)
@@ -45,46 +47,22 @@ def add_to_cart(request):
     if not product_id:
         return Response({"detail": "Product ID is required."}, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        product = Product.objects.get(id=product_id)
-    except Product.DoesNotExist:
-        return Response({"detail": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
-    
     # Validate that quantity is positive
     if quantity <= 0:
         return Response({"detail": "Quantity must be greater than zero."}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Check if this product is already in the cart.
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart, 
-        product=product, 
-        defaults={'quantity': 0}  # Start with 0 and increment below
-    )
-    
-    # Calculate new quantity
-    new_quantity = cart_item.quantity + quantity
-    
-    # Check if enough stock is available
-    if new_quantity > product.stock:
-        available = product.stock - cart_item.quantity
-        if available <= 0:
-            return Response(
-                {"detail": f"Product '{product.name}' is out of stock."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        else:
-            return Response(
-                {"detail": f"Cannot add {quantity} more units of '{product.name}'. Only {available} more units available."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-    
-    # Update quantity
-    cart_item.quantity = new_quantity
-    cart_item.save()
+    # The active cart storage checks stock and adds to the existing quantity
+    try:
+        data = get_cart_storage().add_item(user, product_id, quantity)
+    except CartItemError as exc:
+        return Response({"detail": exc.detail}, status=exc.status_code)
     
-    return Response(CartItemSerializer(cart_item).data, status=status.HTTP_201_CREATED)
+    return Response(data, status=status.HTTP_201_CREATED)
 
 # View all items in the cart.
+# Supports conditional GET: the ETag is derived from the cart state and the catalog version.
+# The cart is read from the active cart storage (see cart/storage.py), which renders it
+# in a fixed number of queries and caches the result under the same state.
 @swagger_auto_schema(
     method='GET',
     operation_summary='View cart',
@@ -97,13 +75,18 @@ def view_cart(request):
     if user.is_anonymous:
         return Response({"detail": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    try:
-        cart = Cart.objects.get(user=user)
-    except Cart.DoesNotExist:
+    cart = get_cart_storage().snapshot(user)
+    if cart is None:
         return Response({"detail": "Cart is empty."}, status=status.HTTP_200_OK)
     
-    serializer = CartSerializer(cart)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    # Cart items embed product details, so catalog changes also change the representation
+    etag = make_etag(*cart.state)
+    last_modified = max(cart.updated_at, get_catalog_last_modified())
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    
+    return set_validators(Response(cart.render(), status=status.HTTP_200_OK), etag, last_modified)
 
 # Remove an item from the cart.
 @swagger_auto_schema(
@@ -111,9 +94,15 @@ def view_cart(request):
     operation_summary='Remove item from cart',
     operation_description='Removes a specific item from the cart using its ID.',
     manual_parameters=[
-        openapi.Parameter('cart_item_id', openapi.IN_PATH, description="ID of the cart item", type=openapi.TYPE_INTEGER)
+        openapi.Parameter('cart_item_id', openapi.IN_PATH, type=openapi.TYPE_INTEGER,
+                          description="ID of the cart item, as listed by GET /cart/. With the cache cart storage "
+                                      "(CART_STORAGE = 'cart.storage.CacheCartStorage') item ids are product ids.")
     ],
-    responses={204: 'No Content'}
+    responses={
+        204: 'No Content',
+        404: "Not Found - No such item in the cart",
+        409: "Conflict - The cart is being updated by another request"
+    }
 )
 @api_view(['DELETE'])
 def remove_from_cart(request, cart_item_id):
@@ -122,10 +111,73 @@ def remove_from_cart(request, cart_item_id):
         return Response({"detail": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
     
     try:
-        cart = Cart.objects.get(user=user)
-        cart_item = CartItem.objects.get(cart=cart, id=cart_item_id)
-    except (Cart.DoesNotExist, CartItem.DoesNotExist):
+        removed = get_cart_storage().remove_item(user, cart_item_id)
+    except CartItemError as exc:
+        return Response({"detail": exc.detail}, status=exc.status_code)
+    if not removed:
         return Response({"detail": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
     
-    cart_item.delete()
     return Response(status=status.HTTP_204_NO_CONTENT)
+
+# Apply several item operations to the cart in one request.
+# All operations are validated first (one stock query) and applied atomically with bulk writes.
+@swagger_auto_schema(
+    method='PATCH',
+    operation_summary='Update cart items in bulk',
+    operation_description=(
+        "Applies a list of operations to the current user's cart in order. "
+        "'set' replaces an item's quantity (0 removes it), 'increment' adds to it and 'remove' deletes it. "
+        "Either every operation is applied or none is."
+    ),
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        required=['operations'],
+        properties={
+            'operations': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                description=f'Operations to apply (max {MAX_CART_OPERATIONS})',
+                items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    required=['product_id'],
+                    properties={
+                        'product_id': openapi.Schema(type=openapi.TYPE_INTEGER, description='ID of the product'),
+                        'action': openapi.Schema(type=openapi.TYPE_STRING, enum=list(CART_ITEM_ACTIONS), description="Operation (default: 'set')"),
+                        'quantity': openapi.Schema(type=openapi.TYPE_INTEGER, description="Quantity (not used by 'remove')"),
+                    }
+                )
+            )
+        }
+    ),
+    responses={
+        200: CartSerializer,
+        400: "Bad Request - Invalid operations or insufficient stock",
+        401: "Unauthorized - Authentication required",
+        409: "Conflict - The cart is being updated by another request"
+    }
+)
+@api_view(['PATCH'])
+@parser_classes([JSONParser])
+def update_cart_items(request):
+    user = request.user
+    if user.is_anonymous:
+        return Response({"detail": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    operations = request.data.get('operations') if isinstance(request.data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return Response({"detail": "A non-empty 'operations' list is required."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(operations) > MAX_CART_OPERATIONS:
+        return Response({"detail": f"At most {MAX_CART_OPERATIONS} operations are allowed per request."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = CartItemOperationSerializer(data=operations, many=True)
+    if not serializer.is_valid():
+        return Response({"operations": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        data = get_cart_storage().apply_operations(user, serializer.validated_data)
+    except CartOperationError as exc:
+        return Response({"detail": "Cart was not updated.", "errors": exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+    except CartItemError as exc:
+        return Response({"detail": exc.detail}, status=exc.status_code)
+    
+    return Response(data, status=status.HTTP_200_OK)
@@ -0,0 +1,44 @@
+from django.db import transaction
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+# Orders in these statuses no longer change and can be archived
+ARCHIVABLE_STATUSES = ('DELIVERED', 'CANCELLED')
+
+ORDER_FIELDS = ('id', 'user_id', 'full_name', 'address', 'phone', 'email', 'status', 'total_amount',
+                'created_at', 'updated_at')
+ORDER_ITEM_FIELDS = ('id', 'order_id', 'product_id', 'category_id', 'quantity', 'price')
+
+
+def archive_orders(created_before, chunk_size=1000):
+    """
+    Move finished orders created before the cutoff, with their items, to the
+    archive tables. Every chunk is copied and deleted in its own transaction,
+    so the job can be interrupted and resumed at any point.
+    """
+    archived = 0
+    while True:
+        ids = list(
+            Order.objects.filter(status__in=ARCHIVABLE_STATUSES, created_at__lt=created_before)
+            .order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        archived += archive_order_chunk(ids)
+    return archived
+
+
+@transaction.atomic
+def archive_order_chunk(ids):
+    # Re-check the status under lock in case an order changed since it was selected
+    orders = list(
+        Order.objects.select_for_update().filter(id__in=ids, status__in=ARCHIVABLE_STATUSES).values(*ORDER_FIELDS)
+    )
+    ids = [order['id'] for order in orders]
+    items = OrderItem.objects.filter(order_id__in=ids).values(*ORDER_ITEM_FIELDS)
+
+    ArchivedOrder.objects.bulk_create([ArchivedOrder(**order) for order in orders], ignore_conflicts=True)
+    ArchivedOrderItem.objects.bulk_create([ArchivedOrderItem(**item) for item in items], ignore_conflicts=True)
+    OrderItem.objects.filter(order_id__in=ids).delete()
+    Order.objects.filter(id__in=ids).delete()
+    return len(ids)
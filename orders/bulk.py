@@ -0,0 +1,155 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from django.utils import timezone
+
+from products.cache import invalidate_product_stock
+from products.models import Product
+from users.models import Transaction, UserProfile
+from .checkout import case_on
+from .models import Order, OrderItem
+from .sales import order_sales_lines, record_sales
+
+# Statuses an order may be moved to from each status
+ALLOWED_TRANSITIONS = {
+    'PENDING': {'PROCESSING', 'CANCELLED'},
+    'PROCESSING': {'SHIPPED', 'CANCELLED'},
+    'SHIPPED': {'DELIVERED'},
+    'DELIVERED': set(),
+    'CANCELLED': set(),
+}
+
+
+class OrderStatusUpdater:
+    """
+    Moves batches of orders to a target status in chunked transactions.
+
+    Each chunk locks its orders, checks every transition and moves the valid
+    ones with a single UPDATE. Cancelled orders are restocked with one
+    UPDATE on the products, refunded with one UPDATE on the profiles, and get
+    their refund transactions in one bulk_create.
+    """
+
+    def __init__(self, target_status, chunk_size=1000):
+        self.target_status = target_status
+        self.chunk_size = chunk_size
+        self.updated = 0
+        self.failed = 0
+        self.results = []
+
+    def run_ids(self, order_ids):
+        order_ids = list(dict.fromkeys(order_ids))
+        for start in range(0, len(order_ids), self.chunk_size):
+            self.update_chunk(order_ids[start:start + self.chunk_size])
+        return self.report()
+
+    def run_filter(self, queryset):
+        # Walk the matching orders in id order so each chunk is a cheap range scan
+        last_id = 0
+        while True:
+            ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:self.chunk_size])
+            if not ids:
+                break
+            self.update_chunk(ids)
+            last_id = ids[-1]
+        return self.report()
+
+    def report(self):
+        return {
+            'status': self.target_status,
+            'updated': self.updated,
+            'failed': self.failed,
+            'results': self.results,
+        }
+
+    def add_result(self, order_id, detail=None):
+        if detail is None:
+            self.updated += 1
+            self.results.append({'id': order_id, 'result': 'updated'})
+        else:
+            self.failed += 1
+            self.results.append({'id': order_id, 'result': 'failed', 'detail': detail})
+
+    @transaction.atomic
+    def update_chunk(self, order_ids):
+        orders = {
+            row['id']: row for row in Order.objects.select_for_update().filter(id__in=order_ids)
+            .order_by('id').values('id', 'status', 'user_id', 'total_amount')
+        }
+        eligible, errors = [], {}
+        for order_id in order_ids:
+            order = orders.get(order_id)
+            if order is None:
+                errors[order_id] = "Order not found."
+            elif self.target_status not in ALLOWED_TRANSITIONS[order['status']]:
+                errors[order_id] = f"Cannot change status from {order['status']} to {self.target_status}."
+            else:
+                eligible.append(order)
+
+        if eligible:
+            if self.target_status == 'CANCELLED':
+                self.cancel(eligible)
+            Order.objects.filter(id__in=[order['id'] for order in eligible]).update(
+                status=self.target_status, updated_at=timezone.now()
+            )
+        # Report in request order
+        for order_id in order_ids:
+            self.add_result(order_id, errors.get(order_id))
+
+    def cancel(self, orders):
+        """
+        Return the items of the orders to inventory, refund their totals and
+        remove them from the sales rollups. Returns {order_id: refunded amount}.
+        The caller holds the orders' row locks and sets their status.
+        """
+        order_ids = [order['id'] for order in orders]
+        record_sales(order_sales_lines(order_ids), sign=-1)
+
+        # Lock products in id order, like checkout, so the two cannot deadlock
+        quantities = dict(
+            OrderItem.objects.filter(order_id__in=order_ids).values('product_id')
+            .annotate(quantity=Sum('quantity')).values_list('product_id', 'quantity')
+        )
+        if quantities:
+            list(Product.objects.select_for_update().filter(id__in=quantities).order_by('id').values_list('id'))
+            Product.objects.filter(id__in=quantities).update(stock=F('stock') + case_on('id', quantities))
+            transaction.on_commit(lambda: invalidate_product_stock(list(quantities)))
+
+        # Legacy orders stored without a total are refunded from their items
+        item_totals = dict(
+            OrderItem.objects.filter(order_id__in=[order['id'] for order in orders if not order['total_amount']])
+            .values('order_id').annotate(total=Sum(F('quantity') * F('price'), output_field=DecimalField()))
+            .values_list('order_id', 'total')
+        )
+        refunds = {order['id']: order['total_amount'] or item_totals.get(order['id'], Decimal('0.00')) for order in orders}
+
+        # Profiles without a balance (staff accounts) are not refunded, like UserProfile.refund
+        user_ids = {order['user_id'] for order in orders}
+        credited = set(
+            UserProfile.objects.filter(user_id__in=user_ids, balance__isnull=False).values_list('user_id', flat=True)
+        )
+        refunds = {
+            order['id']: refunds[order['id']] if order['user_id'] in credited else Decimal('0.00')
+            for order in orders
+        }
+
+        per_user = defaultdict(Decimal)
+        for order in orders:
+            per_user[order['user_id']] += refunds[order['id']]
+        per_user = {user_id: amount for user_id, amount in per_user.items() if amount > 0}
+        if per_user:
+            UserProfile.objects.filter(user_id__in=per_user).update(
+                balance=F('balance') + case_on('user_id', per_user, DecimalField(max_digits=10, decimal_places=2))
+            )
+            Transaction.objects.bulk_create([
+                Transaction(
+                    user_id=order['user_id'],
+                    amount=refunds[order['id']],
+                    transaction_type='REFUND',
+                    description=f"Refund for cancelled order #{order['id']}",
+                )
+                for order in orders if refunds[order['id']] > 0
+            ])
+        return refunds
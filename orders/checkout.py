@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from products.cache import invalidate_product_stock
+from products.models import Product
+from .models import OrderItem
+from .sales import record_sales
+from .tasks import schedule_order_processing
+
+
+class CheckoutError(Exception):
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+def case_on(field, values, output_field=None):
+    """
+    SQL CASE picking values[key] for the row whose field equals key
+    """
+    return Case(
+        *[When(**{field: key}, then=Value(value)) for key, value in values.items()],
+        output_field=output_field or IntegerField(),
+    )
+
+
+@transaction.atomic
+def checkout(user, cart, serializer):
+    """
+    Turn the cart into an order with a fixed number of queries, whatever its size.
+
+    The products are locked in id order (so concurrent checkouts cannot
+    deadlock) and checked against stock. Then the balance is charged with one
+    conditional UPDATE, stock is taken with one conditional UPDATE, and the
+    order items are written with one bulk_create. The daily sales rollups
+    are updated and the order's processing job is queued in the same
+    transaction. Any failure rolls back everything and raises CheckoutError.
+    """
+    quantities = dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity'))
+    if not quantities:
+        raise CheckoutError("Your cart is empty. Please add items to your cart before placing an order.")
+    
+    products = list(
+        Product.objects.select_for_update().filter(id__in=quantities).order_by('id').only('id', 'name', 'price', 'stock', 'category_id')
+    )
+    for product in products:
+        if quantities[product.id] > product.stock:
+            raise CheckoutError(f"Not enough stock for '{product.name}'. Available: {product.stock}")
+    total = sum((product.price * quantities[product.id] for product in products), Decimal('0.00'))
+    
+    # Deduct the total from user's balance
+    profile = user.profile
+    if not profile.withdraw(total):
+        raise CheckoutError(
+            f"Insufficient balance. Your balance: {profile.balance if profile.balance is not None else '0.00'}, Order total: {total}"
+        )
+    
+    # Rows are locked, the stock condition only guards against a broken invariant
+    taken = Product.objects.filter(id__in=quantities, stock__gte=case_on('id', quantities)).update(
+        stock=F('stock') - case_on('id', quantities)
+    )
+    if taken != len(quantities):
+        raise CheckoutError("Stock changed during checkout. Please try again.")
+    
+    order = serializer.save(total_amount=total)
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order, product=product, category_id=product.category_id,
+            quantity=quantities[product.id], price=product.price,
+        )
+        for product in products
+    ])
+    day = timezone.localdate(order.created_at)
+    record_sales([
+        (day, product.id, product.category_id, quantities[product.id], product.price)
+        for product in products
+    ])
+    
+    # Everything after checkout runs in the job worker
+    schedule_order_processing(order)
+    
+    # Clear the cart and reset its total
+    CartItem.objects.filter(cart=cart).delete()
+    Cart.objects.filter(pk=cart.pk).update(total_amount=Decimal('0.00'), updated_at=timezone.now())
+    
+    # Stock is part of the product representation and the bulk update skipped post_save
+    transaction.on_commit(lambda: invalidate_product_stock(list(quantities)))
+    return order
@@ -0,0 +1,14 @@
+def apply_order_filters(queryset, filters, prefix=''):
+    """
+    Apply validated order filters (see OrderFilterSerializer) to a queryset
+    of orders, or of rows related to orders when prefix is e.g. 'order__'
+    """
+    if 'status' in filters:
+        queryset = queryset.filter(**{f'{prefix}status': filters['status']})
+    if 'user' in filters:
+        queryset = queryset.filter(**{f'{prefix}user_id': filters['user']})
+    if 'created_after' in filters:
+        queryset = queryset.filter(**{f'{prefix}created_at__gte': filters['created_after']})
+    if 'created_before' in filters:
+        queryset = queryset.filter(**{f'{prefix}created_at__lt': filters['created_before']})
+    return queryset
@@ -0,0 +1,104 @@
+"""
+Database-backed job queue.
+
+Jobs are rows of orders.models.Job. enqueue() adds one (inside the caller's
+transaction, so a rolled back request never leaves a job behind) and the
+`run_jobs` management command claims due jobs and runs the registered handler
+for each. Failing jobs are retried with exponential backoff until they run
+out of attempts.
+"""
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def register(name):
+    """
+    Register the decorated function as the handler of jobs called name
+    """
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=None):
+    if name not in _handlers:
+        raise ValueError(f"No handler registered for job '{name}'")
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5),
+    )
+
+
+def retry_delay(attempts):
+    """
+    Seconds to wait before the next attempt: doubles with every failed attempt
+    """
+    base = getattr(settings, 'JOB_RETRY_BACKOFF', 10)
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'JOB_RETRY_BACKOFF_MAX', 3600))
+
+
+def claim_jobs(limit, worker_id=None):
+    """
+    Claim up to limit due jobs for this worker.
+
+    Due jobs are pending jobs whose run time has come, plus running jobs whose
+    worker stopped answering (locked longer than JOB_LOCK_TIMEOUT). The claim
+    is one conditional UPDATE tagged with a fresh token, so concurrent workers
+    never run the same job twice.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 300))
+    due = Q(status='PENDING', run_at__lte=now) | Q(status='RUNNING', locked_at__lt=stale)
+    candidates = list(Job.objects.filter(due).order_by('run_at', 'id').values_list('id', flat=True)[:limit])
+    if not candidates:
+        return []
+    
+    token = f'{worker_id or "worker"}:{uuid.uuid4().hex}'[:64]
+    Job.objects.filter(due, pk__in=candidates).update(
+        status='RUNNING', locked_at=now, locked_by=token, attempts=F('attempts') + 1, updated_at=now,
+    )
+    return list(Job.objects.filter(locked_by=token, status='RUNNING').order_by('run_at', 'id'))
+
+
+def run_job(job):
+    """
+    Run a claimed job and record the outcome; returns True on success
+    """
+    try:
+        handler = _handlers.get(job.name)
+        if handler is None:
+            raise LookupError(f"No handler registered for job '{job.name}'")
+        handler(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            logger.warning('Job %s (%s) failed, attempt %s of %s', job.id, job.name, job.attempts, job.max_attempts)
+            fields = {'status': 'PENDING', 'run_at': now + timedelta(seconds=retry_delay(job.attempts))}
+        else:
+            logger.error('Job %s (%s) failed permanently', job.id, job.name)
+            fields = {'status': 'FAILED'}
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+            last_error=error[-4000:], locked_at=None, updated_at=now, **fields
+        )
+        return False
+    
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status='DONE', locked_at=None, last_error='', updated_at=timezone.now()
+    )
+    return True
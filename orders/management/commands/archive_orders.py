@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move delivered and cancelled orders older than the retention age to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive orders created more than DAYS days ago (default: ARCHIVE_ORDERS_AFTER_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of orders moved per transaction')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else getattr(settings, 'ARCHIVE_ORDERS_AFTER_DAYS', 365)
+        archived = archive_orders(timezone.now() - timedelta(days=days), chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} orders.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Compute the totals of legacy orders stored with a zero total from their items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of orders updated per statement')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                Order.objects.filter(id__gt=last_id, total_amount=0)
+                .order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            updated += Order.recalculate_totals(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {updated} orders.'))
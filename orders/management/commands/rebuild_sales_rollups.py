@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from orders.sales import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily product and category sales rollups from all order lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Number of rollup rows written per batch')
+
+    def handle(self, *args, **options):
+        products, categories = rebuild_sales_rollups(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {products} product and {categories} category sales rows.'
+        ))
@@ -0,0 +1,64 @@
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from orders.jobs import claim_jobs, run_job
+
+
+def execute(job):
+    close_old_connections()
+    try:
+        return run_job(job)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (order processing, post-checkout hooks) with retries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Jobs run in parallel by each worker process (threads)')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when no job is due')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no job is due instead of polling')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            self.work(options, worker_id='worker-0')
+            return
+
+        # Each process opens its own database connections after the fork
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=self.work, args=(options, f'worker-{number}'))
+            for number in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def work(self, options, worker_id):
+        succeeded = failed = 0
+        with ThreadPoolExecutor(max_workers=options['concurrency'], thread_name_prefix=worker_id) as pool:
+            while True:
+                jobs = claim_jobs(options['concurrency'], worker_id=worker_id)
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                for ok in pool.map(execute, jobs):
+                    if ok:
+                        succeeded += 1
+                    else:
+                        failed += 1
+        self.stdout.write(self.style.SUCCESS(f'{worker_id}: {succeeded} jobs done, {failed} failed.'))
@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import User
-from products.models import Product
+from products.models import Category, Product
 from decimal import Decimal
 
 class Order(models.Model):
@@ -42,8 +45,27 @@ class Order(models.Model):
         self.save()
         return total
     
+    @classmethod
+    def recalculate_totals(cls, orders):
+        """
+        Recompute the totals of the given orders (queryset or ids) from their items with a single UPDATE
+        """
+        if not isinstance(orders, models.QuerySet):
+            orders = cls.objects.filter(pk__in=orders)
+        line_totals = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(
+            total=Sum(F('quantity') * F('price'), output_field=DecimalField(max_digits=10, decimal_places=2))
+        ).values('total')
+        return orders.update(total_amount=Coalesce(
+            Subquery(line_totals, output_field=DecimalField(max_digits=10, decimal_places=2)),
+            Value(Decimal('0.00')),
+        ))
+    
     class Meta:
         ordering = ['-created_at']
+        # Serve a user's order history newest first (see orders.views.order_list)
+        indexes = [
+            models.Index(fields=['user', 'status', '-created_at', '-id'], name='order_user_status_created_idx'),
+        ]
     
 class OrderItem(models.Model):
     """
@@ -53,9 +75,121 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)  # Store price at time of purchase
+    # Product category at time of purchase (sales rollups); empty for items stored before it was recorded
+    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                                 related_name='+')
     
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in Order #{self.order.id}"
     
     class Meta:
         ordering = ['order', 'id']
+
+class ArchivedOrder(models.Model):
+    """
+    Delivered or cancelled order moved out of the Order table by
+    `manage.py archive_orders`; keeps the original id and timestamps
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    full_name = models.CharField(max_length=100)
+    address = models.TextField()
+    phone = models.CharField(max_length=20)
+    email = models.EmailField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Archived order #{self.id} by {self.user.username}"
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='archived_order_user_idx'),
+        ]
+
+class ArchivedOrderItem(models.Model):
+    """
+    Item of an archived order. The product reference is not enforced,
+    so archived items never keep a product from being deleted.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    class Meta:
+        ordering = ['order', 'id']
+
+class ProductSalesDay(models.Model):
+    """
+    Units sold and revenue per product and day (of order creation),
+    excluding cancelled orders. Maintained by orders.sales.
+    """
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    units = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='product_sales_day_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'day'], name='product_sales_product_idx'),
+        ]
+
+class CategorySalesDay(models.Model):
+    """
+    Units sold and revenue per category and day, excluding cancelled orders.
+    Maintained by orders.sales.
+    """
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    units = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='category_sales_day_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'day'], name='category_sales_category_idx'),
+        ]
+
+class Job(models.Model):
+    """
+    Background job stored in the database and executed by `manage.py run_jobs`
+    """
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    )
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Job #{self.id} {self.name} ({self.status})"
+    
+    class Meta:
+        # Workers claim due jobs by status and run time
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
@@ -0,0 +1,9 @@
+from products.pagination import KeysetPagination
+
+
+class OrderCursorPagination(KeysetPagination):
+    """
+    Keyset pagination over (created_at, id), newest orders first
+    """
+    page_size = 20
+    max_page_size = 100
@@ -0,0 +1,203 @@
+"""
+Daily sales rollups per product and per category.
+
+Checkout adds its lines and cancellations subtract them, each with a fixed
+number of set-based statements, so the rollups always equal the aggregate
+of all non-cancelled order lines (archived ones included) grouped by the
+day the order was created. Category totals use the category stored on the
+order item at checkout, so moving a product to another category later does
+not shift its past sales; items stored before that was recorded fall back
+to the product's current category. The product rollup is kept per product
+only, so filtering it by category means the product's current category.
+`manage.py rebuild_sales_rollups` recomputes the rollups from scratch, e.g.
+to backfill them.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from products.models import Category, Product
+from .models import ArchivedOrderItem, CategorySalesDay, OrderItem, ProductSalesDay
+
+REVENUE_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+# Rollup rows incremented per UPDATE
+DELTA_BATCH_SIZE = 100
+
+
+def sale_category():
+    """
+    Category an order line is counted under
+    """
+    return Coalesce('category_id', 'product__category_id')
+
+
+def apply_deltas(model, key_field, deltas):
+    """
+    Add {(day, key): [units, revenue]} to the rollup rows: missing rows are
+    inserted empty first, then each batch of rows is incremented by one UPDATE
+    """
+    keys = sorted(deltas)
+    for start in range(0, len(keys), DELTA_BATCH_SIZE):
+        batch = keys[start:start + DELTA_BATCH_SIZE]
+        model.objects.bulk_create([model(day=day, **{key_field: key}) for day, key in batch], ignore_conflicts=True)
+        
+        conditions = [Q(day=day, **{key_field: key}) for day, key in batch]
+        selected = Q()
+        for condition in conditions:
+            selected |= condition
+        units = Case(
+            *[When(condition, then=Value(deltas[key][0])) for condition, key in zip(conditions, batch)],
+            default=Value(0),
+        )
+        revenue = Case(
+            *[When(condition, then=Value(deltas[key][1])) for condition, key in zip(conditions, batch)],
+            default=Value(Decimal('0.00')), output_field=REVENUE_FIELD,
+        )
+        model.objects.filter(selected).update(units=F('units') + units, revenue=F('revenue') + revenue)
+
+
+def record_sales(lines, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) order lines given as
+    (day, product_id, category_id, quantity, price) tuples
+    """
+    products = defaultdict(lambda: [0, Decimal('0.00')])
+    categories = defaultdict(lambda: [0, Decimal('0.00')])
+    for day, product_id, category_id, quantity, price in lines:
+        for deltas, key in ((products, product_id), (categories, category_id)):
+            if key is None:
+                continue
+            deltas[(day, key)][0] += sign * quantity
+            deltas[(day, key)][1] += sign * quantity * price
+    apply_deltas(ProductSalesDay, 'product_id', products)
+    apply_deltas(CategorySalesDay, 'category_id', categories)
+
+
+def order_sales_lines(order_ids):
+    """
+    Rollup lines of the given orders, read with one query
+    """
+    rows = OrderItem.objects.filter(order_id__in=order_ids).annotate(sale_category=sale_category()).values_list(
+        'order__created_at', 'product_id', 'sale_category', 'quantity', 'price'
+    )
+    return [(timezone.localdate(created_at),) + tuple(rest) for created_at, *rest in rows]
+
+
+def aggregate_lines(item_model, key):
+    """
+    (day, key, units, revenue) of the non-cancelled lines of item_model, grouped in the database
+    """
+    return item_model.objects.exclude(order__status='CANCELLED').annotate(
+        day=TruncDate('order__created_at'), rollup_key=key,
+    ).filter(rollup_key__isnull=False).values('day', 'rollup_key').annotate(
+        units=Sum('quantity'),
+        revenue=Sum(F('quantity') * F('price'), output_field=REVENUE_FIELD),
+    ).values_list('day', 'rollup_key', 'units', 'revenue').order_by()
+
+
+@transaction.atomic
+def rebuild_sales_rollups(chunk_size=5000):
+    """
+    Recompute both rollups from all non-cancelled order lines. Live lines are
+    inserted in bulk, archived lines are then added on top (an archived and a
+    live order can share a day).
+    """
+    counts = []
+    for model, key_field, key in (
+        (ProductSalesDay, 'product_id', F('product_id')),
+        (CategorySalesDay, 'category_id', sale_category()),
+    ):
+        model.objects.all().delete()
+        rows = (
+            model(day=day, units=units, revenue=revenue, **{key_field: key})
+            for day, key, units, revenue in aggregate_lines(OrderItem, key).iterator(chunk_size=chunk_size)
+        )
+        while batch := list(islice(rows, chunk_size)):
+            model.objects.bulk_create(batch)
+        
+        deltas = {}
+        for day, key, units, revenue in aggregate_lines(ArchivedOrderItem, key).iterator(chunk_size=chunk_size):
+            deltas[(day, key)] = [units, revenue]
+            if len(deltas) >= chunk_size:
+                apply_deltas(model, key_field, deltas)
+                deltas = {}
+        apply_deltas(model, key_field, deltas)
+        counts.append(model.objects.count())
+    return tuple(counts)
+
+
+def money(value):
+    """
+    Format a revenue sum like the serializers format amounts
+    """
+    return f"{Decimal(value):.2f}"
+
+
+def daily_sales(start, end, product=None, category=None):
+    """
+    Units and revenue per day in [start, end], for one product, one category
+    or the whole shop (summed over the category rollup)
+    """
+    if product is not None:
+        rows = ProductSalesDay.objects.filter(product_id=product)
+    else:
+        rows = CategorySalesDay.objects.all()
+        if category is not None:
+            rows = rows.filter(category_id=category)
+    rows = rows.filter(day__range=(start, end)).values('day').annotate(
+        units=Sum('units'), revenue=Sum('revenue'),
+    ).order_by('day')
+    return [
+        {'day': row['day'], 'units': row['units'], 'revenue': money(row['revenue'])}
+        for row in rows
+    ]
+
+
+def top_sellers(model, key_field, catalog, start, end, order_by='revenue', limit=10, **filters):
+    """
+    Rollup keys with the most revenue (or units) in [start, end], named from catalog
+    """
+    rows = model.objects.filter(day__range=(start, end), **filters).values(key_field).annotate(
+        units=Sum('units'), revenue=Sum('revenue'),
+    ).order_by(f'-{order_by}', key_field)[:limit]
+    rows = list(rows)
+    names = catalog.in_bulk([row[key_field] for row in rows])
+    return [
+        {
+            'id': row[key_field],
+            'name': names[row[key_field]].name if row[key_field] in names else None,
+            'units': row['units'],
+            'revenue': money(row['revenue']),
+        }
+        for row in rows
+    ]
+
+
+def top_products(start, end, order_by='revenue', limit=10, category=None):
+    """
+    Best-selling products in [start, end], optionally only those currently in
+    one category. The product rollup is not split by category, so a product's
+    totals include sales made while it was in another category; sales per
+    category of sale come from top_categories() and daily_sales().
+    """
+    filters = {'product__category_id': category} if category is not None else {}
+    return top_sellers(
+        ProductSalesDay, 'product_id', Product.objects.only('id', 'name'),
+        start, end, order_by, limit, **filters,
+    )
+
+
+def top_categories(start, end, order_by='revenue', limit=10):
+    """
+    Best-selling categories in [start, end]
+    """
+    return top_sellers(
+        CategorySalesDay, 'category_id', Category.objects.only('id', 'name'),
+        start, end, order_by, limit,
+    )
@@ -1,9 +1,13 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
+from .export import FILE_FORMATS
 from .models import Order, OrderItem
-from products.serializers import ProductSerializer
+from products.serializers import ProductReadSerializer
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_details = ProductSerializer(source='product', read_only=True)
+    product_details = ProductReadSerializer(source='product', read_only=True)
     
     class Meta:
         model = OrderItem
@@ -36,4 +40,47 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         validated_data['user'] = user
         order = Order.objects.create(**validated_data)
-        return order 
\ No newline at end of file
+        return order
+
+class OrderFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    user = serializers.IntegerField(required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+class OrderBulkStatusSerializer(serializers.Serializer):
+    # Either explicit order ids or a filter selecting the orders
+    order_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False, max_length=10000)
+    filter = OrderFilterSerializer(required=False)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    
+    def validate(self, attrs):
+        if ('order_ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError("Provide either 'order_ids' or 'filter'.")
+        if 'filter' in attrs and not attrs['filter']:
+            raise serializers.ValidationError({'filter': ['At least one filter is required.']})
+        return attrs
+
+class OrderExportFilterSerializer(OrderFilterSerializer):
+    file_format = serializers.ChoiceField(choices=FILE_FORMATS, required=False, default='csv')
+    product = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(required=False)
+    include_archived = serializers.BooleanField(required=False, default=False)
+
+class SalesQuerySerializer(serializers.Serializer):
+    # Inclusive day range, the last 30 days by default
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    product = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(required=False)
+    order_by = serializers.ChoiceField(choices=['revenue', 'units'], required=False, default='revenue')
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=100)
+    
+    def validate(self, attrs):
+        attrs.setdefault('end', timezone.localdate())
+        attrs.setdefault('start', attrs['end'] - timedelta(days=29))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'start': ['Must not be after end.']})
+        if 'product' in attrs and 'category' in attrs:
+            raise serializers.ValidationError("Provide either 'product' or 'category', not both.")
+        return attrs
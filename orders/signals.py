@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# Post-checkout hooks: sent with `order` by the process_order job, outside the checkout request
+order_placed = Signal()
@@ -0,0 +1,45 @@
+from django.utils import timezone
+
+from .jobs import enqueue, register
+from .models import Order
+from .signals import order_placed
+
+# Status an order moves to from each status when it is advanced
+ORDER_TRANSITIONS = {
+    'PENDING': 'PROCESSING',
+    'PROCESSING': 'SHIPPED',
+    'SHIPPED': 'DELIVERED',
+}
+
+
+def advance_order_status(order_id, from_status):
+    """
+    Move an order to the next status if it is still in from_status.
+    The conditional UPDATE makes the transition safe against concurrent
+    changes such as a cancellation. Returns True if the order moved.
+    """
+    to_status = ORDER_TRANSITIONS[from_status]
+    return bool(Order.objects.filter(pk=order_id, status=from_status).update(
+        status=to_status, updated_at=timezone.now()
+    ))
+
+
+@register('process_order')
+def process_order(order_id):
+    """
+    Run the post-checkout hooks of a new order, then move it to PROCESSING.
+    A failing hook makes the job retry, so hooks must be idempotent.
+    """
+    order = Order.objects.filter(pk=order_id, status='PENDING').first()
+    if order is None:
+        # Cancelled (or already advanced) in the meantime
+        return
+    order_placed.send(sender=Order, order=order)
+    advance_order_status(order_id, 'PENDING')
+
+
+def schedule_order_processing(order):
+    """
+    Queue the processing of a new order; call inside the checkout transaction
+    """
+    return enqueue('process_order', {'order_id': order.pk})
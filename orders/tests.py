@@ -1,3 +1,524 @@
-from django.test import TestCase
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from products.cache import get_catalog_version
+from products.models import Category, Product
+from users.models import Transaction, UserProfile
+from cart.models import Cart, CartItem
+from .jobs import claim_jobs, enqueue, register, run_job
+from .archive import archive_orders
+from .models import ArchivedOrder, ArchivedOrderItem, CategorySalesDay, Job, Order, OrderItem, ProductSalesDay
+from .sales import record_sales
+from .tasks import process_order
+
+
+class OrderTestMixin:
+    def create_product(self, name='Book', price=5, stock=10, category=None):
+        if category is None:
+            category, _ = Category.objects.get_or_create(name='Books')
+        return Product.objects.create(name=name, price=price, category=category, stock=stock)
+
+    def create_user(self, username='buyer', balance=Decimal('100.00')):
+        user = User.objects.create_user(username, password='secret')
+        user.profile.balance = balance
+        user.profile.save()
+        return user
+
+    def create_order(self, user, lines, status='PENDING', total_amount=None):
+        """
+        Create an order directly from [(product, quantity), ...] lines
+        """
+        if total_amount is None:
+            total_amount = sum(product.price * quantity for product, quantity in lines)
+        order = Order.objects.create(
+            user=user, full_name='Jane Doe', address='1 Main St', phone='555', email='jane@example.com',
+            total_amount=total_amount, status=status,
+        )
+        for product, quantity in lines:
+            OrderItem.objects.create(
+                order=order, product=product, category_id=product.category_id, quantity=quantity, price=product.price,
+            )
+        return order
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def place_order(self, user, lines):
+        """
+        Fill the user's cart with [(product, quantity), ...] and check out through the API
+        """
+        client = self.client_for(user)
+        for product, quantity in lines:
+            response = client.post('/cart/add/', {'product_id': product.id, 'quantity': quantity}, format='json')
+            self.assertEqual(response.status_code, 201)
+        response = client.post('/orders/create/', {
+            'full_name': 'Jane Doe', 'address': '1 Main St', 'phone': '555', 'email': 'jane@example.com',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return Order.objects.get(pk=response.json()['id'])
+
+
+ORDER_BODY = {'full_name': 'Jane Doe', 'address': '1 Main St', 'phone': '555', 'email': 'jane@example.com'}
+
+
+class CheckoutTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = self.create_product('Book', price=5, stock=10)
+        self.pen = self.create_product('Pen', price=2, stock=3)
+        self.user = self.create_user(balance=Decimal('50.00'))
+        self.client = self.client_for(self.user)
+
+    def fill_cart(self, lines):
+        for product, quantity in lines:
+            self.client.post('/cart/add/', {'product_id': product.id, 'quantity': quantity}, format='json')
+
+    def assert_unchanged(self):
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(UserProfile.objects.get(user=self.user).balance, Decimal('50.00'))
+        self.assertEqual(list(Product.objects.order_by('id').values_list('stock', flat=True)), [10, 3])
+
+    def test_checkout_charges_takes_stock_and_empties_cart(self):
+        self.fill_cart([(self.book, 2), (self.pen, 3)])
+        response = self.client.post('/orders/create/', ORDER_BODY, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_amount'], '16.00')
+
+        order = Order.objects.get()
+        self.assertEqual(
+            sorted(order.items.values_list('product_id', 'quantity', 'price', 'category_id')),
+            [(self.book.id, 2, Decimal('5.00'), self.book.category_id), (self.pen.id, 3, Decimal('2.00'), self.pen.category_id)],
+        )
+        self.assertEqual(list(Product.objects.order_by('id').values_list('stock', flat=True)), [8, 0])
+        self.assertEqual(UserProfile.objects.get(user=self.user).balance, Decimal('34.00'))
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(Cart.objects.get(user=self.user).total_amount, Decimal('0.00'))
+        self.assertEqual(list(Job.objects.values_list('name', 'payload')), [('process_order', {'order_id': order.id})])
+
+    def test_deposit_during_checkout_is_not_lost(self):
+        self.fill_cart([(self.book, 2)])
+        # Loaded by a concurrent deposit request before the order charges the balance
+        stale_profile = UserProfile.objects.get(user=self.user)
+
+        def record_and_deposit(*args, **kwargs):
+            record_sales(*args, **kwargs)
+            self.assertTrue(stale_profile.deposit(Decimal('20.00')))
+
+        with mock.patch('orders.checkout.record_sales', side_effect=record_and_deposit):
+            self.assertEqual(self.client.post('/orders/create/', ORDER_BODY, format='json').status_code, 201)
+        self.assertEqual(stale_profile.balance, Decimal('60.00'))
+        self.assertEqual(UserProfile.objects.get(user=self.user).balance, Decimal('60.00'))
+
+        # A refund through a profile loaded before the deposit keeps it too
+        stale_profile = UserProfile.objects.get(pk=stale_profile.pk)
+        UserProfile.objects.get(pk=stale_profile.pk).deposit(Decimal('5.00'))
+        stale_profile.refund(Decimal('10.00'))
+        self.assertEqual(UserProfile.objects.get(user=self.user).balance, Decimal('75.00'))
+
+    def test_insufficient_stock_changes_nothing(self):
+        self.fill_cart([(self.book, 2), (self.pen, 3)])
+        Product.objects.filter(pk=self.pen.pk).update(stock=2)
+        response = self.client.post('/orders/create/', ORDER_BODY, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail'], "Not enough stock for 'Pen'. Available: 2")
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(UserProfile.objects.get(user=self.user).balance, Decimal('50.00'))
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_insufficient_balance_changes_nothing(self):
+        self.fill_cart([(self.book, 10), (self.pen, 1)])
+        response = self.client.post('/orders/create/', ORDER_BODY, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['detail'].startswith('Insufficient balance.'))
+        self.assert_unchanged()
+
+    def test_empty_cart_is_rejected(self):
+        self.assertEqual(self.client.post('/orders/create/', ORDER_BODY, format='json').status_code, 400)
+        self.assert_unchanged()
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        def checkout_queries(products):
+            Product.objects.filter(pk__in=[product.pk for product in products]).update(stock=10)
+            self.fill_cart([(product, 1) for product in products])
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.post('/orders/create/', ORDER_BODY, format='json').status_code, 201)
+            return len(queries)
+
+        extra = [self.create_product(f'Item {i}', price=1) for i in range(8)]
+        self.assertEqual(checkout_queries([self.book, self.pen]), checkout_queries([self.book, self.pen] + extra))
+
+
+handled = []
+
+
+@register('test_record')
+def record_job(value, fail=False):
+    if fail:
+        raise RuntimeError('failed on purpose')
+    handled.append(value)
+
+
+@override_settings(JOB_RETRY_BACKOFF=10, JOB_LOCK_TIMEOUT=300)
+class JobQueueTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        handled.clear()
+
+    def test_claimed_jobs_are_not_claimed_again(self):
+        jobs = [enqueue('test_record', {'value': i}) for i in range(3)]
+        first = claim_jobs(2, 'a')
+        second = claim_jobs(5, 'b')
+        self.assertEqual([job.id for job in first], [jobs[0].id, jobs[1].id])
+        self.assertEqual([job.id for job in second], [jobs[2].id])
+        self.assertEqual(claim_jobs(5, 'c'), [])
+
+        self.assertTrue(run_job(first[0]))
+        self.assertEqual(handled, [0])
+        self.assertEqual(Job.objects.get(pk=jobs[0].pk).status, 'DONE')
+
+    def test_failed_jobs_are_retried_then_given_up(self):
+        job = enqueue('test_record', {'value': 1, 'fail': True}, max_attempts=2)
+        with self.assertLogs('orders.jobs', 'WARNING'):
+            self.assertFalse(run_job(claim_jobs(1)[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('PENDING', 1))
+        self.assertIn('failed on purpose', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertEqual(claim_jobs(1), [])
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('orders.jobs', 'ERROR'):
+            self.assertFalse(run_job(claim_jobs(1)[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('FAILED', 2))
+
+    def test_stale_running_jobs_are_reclaimed(self):
+        job = enqueue('test_record', {'value': 1})
+        claim_jobs(1, 'dead-worker')
+        self.assertEqual(claim_jobs(1), [])
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=301))
+        reclaimed = claim_jobs(1, 'b')
+        self.assertEqual([(claimed.id, claimed.attempts) for claimed in reclaimed], [(job.id, 2)])
+
+    def test_process_order_skips_cancelled_orders(self):
+        user = self.create_user()
+        product = self.create_product()
+        pending = self.create_order(user, [(product, 1)])
+        cancelled = self.create_order(user, [(product, 1)], status='CANCELLED')
+        process_order(pending.id)
+        process_order(cancelled.id)
+        pending.refresh_from_db()
+        cancelled.refresh_from_db()
+        self.assertEqual((pending.status, cancelled.status), ('PROCESSING', 'CANCELLED'))
+
+
+class ArchiveOrdersTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        self.product = self.create_product()
+        self.user = self.create_user()
+        self.cutoff = timezone.now() - timedelta(days=365)
+
+    def create_old_order(self, status, days=400):
+        order = self.create_order(self.user, [(self.product, 1)], status=status)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days))
+        return order
+
+    def test_only_old_finished_orders_are_moved(self):
+        delivered = self.create_old_order('DELIVERED')
+        cancelled = self.create_old_order('CANCELLED')
+        old_pending = self.create_old_order('PENDING')
+        recent = self.create_old_order('DELIVERED', days=10)
+
+        self.assertEqual(archive_orders(self.cutoff, chunk_size=1), 2)
+        self.assertEqual(set(ArchivedOrder.objects.values_list('id', flat=True)), {delivered.id, cancelled.id})
+        self.assertEqual(
+            set(ArchivedOrderItem.objects.values_list('order_id', 'product_id', 'category_id')),
+            {(delivered.id, self.product.id, self.product.category_id), (cancelled.id, self.product.id, self.product.category_id)},
+        )
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {old_pending.id, recent.id})
+        self.assertEqual(archive_orders(self.cutoff), 0)
+
+    def test_archived_orders_are_listed_on_request(self):
+        archived = self.create_old_order('DELIVERED')
+        live = self.create_order(self.user, [(self.product, 2)])
+        archive_orders(self.cutoff)
+
+        client = self.client_for(self.user)
+        ids = [order['id'] for order in client.get('/orders/').json()['results']]
+        self.assertEqual(ids, [live.id])
+        page = client.get('/orders/', {'include_archived': 'true', 'page_size': 1}).json()
+        ids = [order['id'] for order in page['results']]
+        ids += [order['id'] for order in client.get(page['next']).json()['results']]
+        self.assertEqual(ids, [live.id, archived.id])
+
+
+class BulkOrderStatusTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = self.create_product(stock=0)
+        self.admin = User.objects.create_user('admin', password='secret', is_staff=True)
+
+    def bulk_status(self, payload):
+        return self.client_for(self.admin).post('/orders/bulk-status/', payload, format='json')
+
+    def test_bulk_cancel_restocks_and_refunds_once(self):
+        alice, bob = self.create_user('alice', Decimal('0.00')), self.create_user('bob', Decimal('0.00'))
+        orders = [
+            self.create_order(alice, [(self.product, 2)]),
+            self.create_order(alice, [(self.product, 1)], status='PROCESSING'),
+            self.create_order(bob, [(self.product, 3)], total_amount=0),
+            self.create_order(bob, [(self.product, 4)], status='SHIPPED'),
+        ]
+        self.assertEqual(self.client.get(f'/products/{self.product.id}/').json()['stock'], 0)
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.bulk_status({'order_ids': [order.id for order in orders] + [99999], 'status': 'CANCELLED'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['updated'], data['failed']), (3, 2))
+        self.assertEqual([result['id'] for result in data['results']], [order.id for order in orders] + [99999])
+        self.assertEqual(data['results'][3]['result'], 'failed')
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 6)
+        # Only the restocked product is dropped from the catalog cache
+        self.assertEqual(self.client.get(f'/products/{self.product.id}/').json()['stock'], 6)
+        self.assertEqual(get_catalog_version(), version)
+        self.assertEqual(UserProfile.objects.get(user=alice).balance, Decimal('15.00'))
+        # The legacy order without a total is refunded from its items
+        self.assertEqual(UserProfile.objects.get(user=bob).balance, Decimal('15.00'))
+        self.assertEqual(Transaction.objects.filter(transaction_type='REFUND').count(), 3)
+
+        # Cancelling again is rejected and changes nothing
+        data = self.bulk_status({'order_ids': [orders[0].id], 'status': 'CANCELLED'}).json()
+        self.assertEqual(data['failed'], 1)
+        self.assertEqual(UserProfile.objects.get(user=alice).balance, Decimal('15.00'))
+        self.assertEqual(Transaction.objects.filter(transaction_type='REFUND').count(), 3)
+
+    def test_profiles_without_balance_are_not_refunded(self):
+        user = self.create_user('former', balance=None)
+        order = self.create_order(user, [(self.product, 1)])
+        self.assertEqual(self.bulk_status({'order_ids': [order.id], 'status': 'CANCELLED'}).json()['updated'], 1)
+        self.assertIsNone(UserProfile.objects.get(user=user).balance)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_filter_selects_orders(self):
+        user = self.create_user()
+        shipped = [self.create_order(user, [(self.product, 1)], status='SHIPPED') for _ in range(3)]
+        pending = self.create_order(user, [(self.product, 1)])
+        data = self.bulk_status({'filter': {'status': 'SHIPPED'}, 'status': 'DELIVERED'}).json()
+        self.assertEqual(data['updated'], 3)
+        self.assertEqual(
+            set(Order.objects.filter(status='DELIVERED').values_list('id', flat=True)), {order.id for order in shipped}
+        )
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'PENDING')
+
+    def test_requires_ids_or_filter_and_staff(self):
+        self.assertEqual(self.bulk_status({'status': 'DELIVERED'}).status_code, 400)
+        self.assertEqual(self.bulk_status({'filter': {}, 'status': 'DELIVERED'}).status_code, 400)
+        user = self.create_user()
+        response = self.client_for(user).post('/orders/bulk-status/', {'order_ids': [1], 'status': 'SHIPPED'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class ExportOrdersTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        self.books = Category.objects.create(name='Books')
+        self.games = Category.objects.create(name='Games')
+        self.book = self.create_product('Book', price=5, category=self.books)
+        self.game = self.create_product('Game', price=20, category=self.games)
+        user = self.create_user()
+        self.delivered = self.create_order(user, [(self.book, 1), (self.game, 2)], status='DELIVERED')
+        self.pending = self.create_order(user, [(self.book, 3)])
+        self.admin = self.client_for(User.objects.create_user('admin', password='secret', is_staff=True))
+
+    def export(self, **params):
+        response = self.admin.get('/orders/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_has_one_row_per_item(self):
+        rows = list(csv.DictReader(self.export().splitlines()))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(
+            sorted((int(row['order_id']), row['product_name'], int(row['quantity'])) for row in rows),
+            [(self.delivered.id, 'Book', 1), (self.delivered.id, 'Game', 2), (self.pending.id, 'Book', 3)],
+        )
+
+    def test_ndjson_nests_items_and_filters_apply(self):
+        orders = [json.loads(line) for line in self.export(file_format='ndjson', status='DELIVERED').splitlines()]
+        self.assertEqual([order['order_id'] for order in orders], [self.delivered.id])
+        self.assertEqual(len(orders[0]['items']), 2)
+
+        orders = [json.loads(line) for line in self.export(file_format='ndjson', category=self.games.id).splitlines()]
+        self.assertEqual([(order['order_id'], len(order['items'])) for order in orders], [(self.delivered.id, 1)])
+
+    def test_lines_keep_the_category_they_were_sold_under(self):
+        Product.objects.filter(pk=self.book.pk).update(category=self.games)
+        rows = list(csv.DictReader(self.export(category=self.books.id).splitlines()))
+        self.assertEqual(
+            sorted((row['product_name'], int(row['category_id'])) for row in rows),
+            [('Book', self.books.id), ('Book', self.books.id)],
+        )
+
+    def test_invalid_parameters_and_non_staff_are_rejected(self):
+        response = self.admin.get('/orders/export/', {'file_format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file_format', response.json())
+        self.assertEqual(self.admin.get('/orders/export/', {'status': 'LOST'}).status_code, 400)
+        user = self.client_for(self.create_user('other'))
+        self.assertEqual(user.get('/orders/export/').status_code, 403)
+
+
+def rollups():
+    return (
+        sorted(ProductSalesDay.objects.exclude(units=0).values_list('day', 'product_id', 'units', 'revenue')),
+        sorted(CategorySalesDay.objects.exclude(units=0).values_list('day', 'category_id', 'units', 'revenue')),
+    )
+
+
+class SalesRollupTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = Category.objects.create(name='Books')
+        self.games = Category.objects.create(name='Games')
+        self.book = self.create_product('Book', price=5, category=self.books)
+        self.game = self.create_product('Game', price=20, category=self.games)
+        self.user = self.create_user(balance=Decimal('500.00'))
+        self.today = timezone.localdate()
+
+    def test_checkout_and_cancel_maintain_rollups(self):
+        self.place_order(self.user, [(self.book, 2), (self.game, 1)])
+        order = self.place_order(self.user, [(self.book, 1)])
+        self.assertEqual(rollups(), (
+            [(self.today, self.book.id, 3, Decimal('15.00')), (self.today, self.game.id, 1, Decimal('20.00'))],
+            [(self.today, self.books.id, 3, Decimal('15.00')), (self.today, self.games.id, 1, Decimal('20.00'))],
+        ))
+
+        response = self.client_for(self.user).delete(f'/orders/{order.id}/cancel/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(rollups()[0][0], (self.today, self.book.id, 2, Decimal('10.00')))
+
+        # A second cancellation is rejected and does not subtract again
+        self.assertEqual(self.client_for(self.user).delete(f'/orders/{order.id}/cancel/').status_code, 400)
+        self.assertEqual(rollups()[0][0], (self.today, self.book.id, 2, Decimal('10.00')))
+
+    def test_cancel_restocks_and_refunds(self):
+        order = self.place_order(self.user, [(self.book, 4)])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.stock, 6)
+        response = self.client_for(self.user).delete(f'/orders/{order.id}/cancel/')
+        self.assertEqual(response.json()['detail'], 'Order cancelled successfully. Amount refunded: 20.00')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.stock, 10)
+        self.assertEqual(UserProfile.objects.get(user=self.user).balance, Decimal('500.00'))
+        self.assertEqual(Transaction.objects.filter(user=self.user, transaction_type='REFUND').count(), 1)
+
+    def test_cancel_after_category_change_uses_category_of_sale(self):
+        order = self.place_order(self.user, [(self.book, 2)])
+        Product.objects.filter(pk=self.book.pk).update(category=self.games)
+        self.client_for(self.user).delete(f'/orders/{order.id}/cancel/')
+        self.assertEqual(rollups(), ([], []))
+        self.assertFalse(CategorySalesDay.objects.filter(units__lt=0).exists())
+
+    def test_bulk_cancel_removes_sales(self):
+        order = self.place_order(self.user, [(self.book, 2), (self.game, 1)])
+        admin = User.objects.create_user('admin', password='secret', is_staff=True)
+        self.client_for(admin).post('/orders/bulk-status/', {'order_ids': [order.id], 'status': 'CANCELLED'}, format='json')
+        self.assertEqual(rollups(), ([], []))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.place_order(self.user, [(self.book, 2), (self.game, 1)])
+        cancelled = self.place_order(self.user, [(self.game, 2)])
+        self.place_order(self.user, [(self.book, 1)])
+        self.client_for(self.user).delete(f'/orders/{cancelled.id}/cancel/')
+        # Category of sale is kept even when the product moves later
+        Product.objects.filter(pk=self.book.pk).update(category=self.games)
+        incremental = rollups()
+
+        call_command('rebuild_sales_rollups', chunk_size=1, stdout=open('/dev/null', 'w'))
+        self.assertEqual(rollups(), incremental)
+
+    def test_read_endpoints(self):
+        self.place_order(self.user, [(self.book, 3), (self.game, 1)])
+        admin = self.client_for(User.objects.create_user('admin', password='secret', is_staff=True))
+
+        daily = admin.get('/orders/sales/daily/').json()
+        self.assertEqual(daily['results'], [{'day': self.today.isoformat(), 'units': 4, 'revenue': '35.00'}])
+        daily = admin.get('/orders/sales/daily/', {'category': self.books.id}).json()
+        self.assertEqual(daily['results'][0]['revenue'], '15.00')
+
+        products = admin.get('/orders/sales/products/', {'order_by': 'units'}).json()['results']
+        self.assertEqual([(row['name'], row['units']) for row in products], [('Book', 3), ('Game', 1)])
+        categories = admin.get('/orders/sales/categories/', {'limit': 1}).json()['results']
+        self.assertEqual(categories, [{'id': self.games.id, 'name': 'Games', 'units': 1, 'revenue': '20.00'}])
+
+        self.assertEqual(admin.get('/orders/sales/daily/', {'start': '2999-01-01'}).status_code, 400)
+        self.assertEqual(self.client_for(self.user).get('/orders/sales/daily/').status_code, 403)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs row locking from concurrent connections')
+class ConcurrentCancelTests(OrderTestMixin, TransactionTestCase):
+    def test_concurrent_cancels_refund_once(self):
+        cache.clear()
+        product = self.create_product(stock=10)
+        user = self.create_user(balance=Decimal('100.00'))
+        order = self.place_order(user, [(product, 2)])
+
+        def cancel(i):
+            try:
+                return self.client_for(user).delete(f'/orders/{order.id}/cancel/').status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            codes = sorted(executor.map(cancel, range(5)))
+        self.assertEqual(codes, [200, 400, 400, 400, 400])
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 10)
+        self.assertEqual(UserProfile.objects.get(user=user).balance, Decimal('100.00'))
+        self.assertEqual(ProductSalesDay.objects.get(product=product).units, 0)
+
+
+class CreateOrderIdempotencyTests(OrderTestMixin, TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = self.create_product(stock=10)
+        self.user = self.create_user(balance=Decimal('100.00'))
+        self.client_for(self.user).post('/cart/add/', {'product_id': self.product.id, 'quantity': 2}, format='json')
+
+    def create(self, i=0):
+        try:
+            return self.client_for(self.user).post('/orders/create/', ORDER_BODY, format='json', HTTP_IDEMPOTENCY_KEY='order-1')
+        finally:
+            connection.close()
+
+    def test_retry_returns_the_same_order(self):
+        first, retry = self.create(), self.create()
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.json()['id']), (201, first.json()['id']))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(UserProfile.objects.get(user=self.user).balance, Decimal('90.00'))
+
+    def test_concurrent_duplicates_place_one_order(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            responses = list(executor.map(self.create, range(4)))
+        self.assertEqual({response.status_code for response in responses}, {201})
+        self.assertEqual(len({response.json()['id'] for response in responses}), 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(UserProfile.objects.get(user=self.user).balance, Decimal('90.00'))
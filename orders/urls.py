@@ -4,6 +4,11 @@ from . import views
 urlpatterns = [
     path('', views.order_list, name='order-list'),
     path('create/', views.create_order, name='create-order'),
+    path('bulk-status/', views.bulk_update_order_status, name='bulk-update-order-status'),
+    path('export/', views.export_orders_view, name='export-orders'),
+    path('sales/daily/', views.sales_daily, name='sales-daily'),
+    path('sales/products/', views.sales_products, name='sales-products'),
+    path('sales/categories/', views.sales_categories, name='sales-categories'),
     path('<int:order_id>/', views.order_detail, name='order-detail'),
     path('<int:order_id>/cancel/', views.cancel_order, name='cancel-order'),
 ] 
\ No newline at end of file
@@ -5,17 +5,44 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .models import Order, OrderItem
-from .serializers import OrderSerializer, OrderCreateSerializer, OrderItemSerializer
-from cart.models import Cart, CartItem
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+from .serializers import (
+    OrderSerializer, OrderCreateSerializer, OrderItemSerializer, OrderBulkStatusSerializer, OrderExportFilterSerializer,
+    SalesQuerySerializer,
+)
+from cart.models import CartItem
+from cart.storage import get_cart_storage
+from cart.operations import CartItemError
 from django.db import transaction
+from django.utils import timezone
+from django.db.models import Prefetch, prefetch_related_objects
+from .checkout import checkout, CheckoutError
+from .pagination import OrderCursorPagination
+from .bulk import OrderStatusUpdater
+from .filters import apply_order_filters
+from .export import export_orders, FILE_FORMATS
+from .sales import daily_sales, top_products, top_categories
+from django.http import StreamingHttpResponse
+from products.cache import get_catalog_version, get_catalog_last_modified
+from MyShop.conditional import make_etag, not_modified_response, set_validators
+from MyShop.idempotency import idempotent, IDEMPOTENCY_KEY_PARAMETER
 
 # Create your views here.
 
+# Orders are paginated with an opaque cursor on (created_at, id), so every page costs the same.
+# With include_archived=true archived orders are merged into the same sequence.
+# Items and their products are prefetched, and the read path never writes
+# (legacy zero totals are fixed once with `manage.py backfill_order_totals`).
 @swagger_auto_schema(
     method='GET',
     operation_summary='List user orders',
-    operation_description='Retrieves all orders made by the current user.',
+    operation_description='Retrieves the orders made by the current user, newest first, one cursor page at a time.',
+    manual_parameters=[
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of orders per page (max 100)", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor taken from the 'next'/'previous' links", type=openapi.TYPE_STRING),
+        openapi.Parameter('with_count', openapi.IN_QUERY, description="Include the total count of orders", type=openapi.TYPE_BOOLEAN),
+        openapi.Parameter('include_archived', openapi.IN_QUERY, description="Also list archived (old delivered) orders", type=openapi.TYPE_BOOLEAN),
+    ],
     responses={
         200: OrderSerializer(many=True),
         401: "Unauthorized - Authentication required"
@@ -25,18 +52,25 @@ from django.db import transaction
 @permission_classes([IsAuthenticated])
 def order_list(request):
     """
-    List all orders for the current user
+    List the orders of the current user
     """
     # Only show non-cancelled orders
-    orders = Order.objects.filter(user=request.user).exclude(status='CANCELLED')
+    orders = Order.objects.filter(user=request.user).exclude(status='CANCELLED').order_by('-created_at').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+    )
     
-    # Ensure all orders have correct total_amount (only if needed in case of legacy data)
-    for order in orders:
-        if order.total_amount == 0:
-            order.recalculate_total()
+    querysets = [orders]
+    if request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes'):
+        querysets.append(
+            ArchivedOrder.objects.filter(user=request.user).exclude(status='CANCELLED').order_by('-created_at').prefetch_related(
+                Prefetch('items', queryset=ArchivedOrderItem.objects.select_related('product'))
+            )
+        )
     
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    paginator = OrderCursorPagination()
+    page = paginator.paginate_querysets(querysets, request)
+    serializer = OrderSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 @swagger_auto_schema(
     method='GET',
@@ -56,28 +90,34 @@ def order_list(request):
 def order_detail(request, order_id):
     """
     Retrieve details of a specific order
+    Supports conditional GET based on the order's updated_at and the catalog version
     """
     try:
         order = Order.objects.get(id=order_id, user=request.user)
         # Check if order has been cancelled
         if order.status == 'CANCELLED':
             return Response({"detail": "This order has been cancelled."}, status=status.HTTP_404_NOT_FOUND)
-        
-        # Ensure the order has correct total_amount (only if needed in case of legacy data)
-        if order.total_amount == 0:
-            order.recalculate_total()
-            
     except Order.DoesNotExist:
         return Response({"detail": "Order not found."}, status=status.HTTP_404_NOT_FOUND)
     
+    # Order items embed product details, so catalog changes also change the representation
+    etag = make_etag('order', order.id, order.updated_at.isoformat(), get_catalog_version())
+    last_modified = max(order.updated_at, get_catalog_last_modified())
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    
+    prefetch_related_objects([order], Prefetch('items', queryset=OrderItem.objects.select_related('product')))
     serializer = OrderSerializer(order)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return set_validators(Response(serializer.data, status=status.HTTP_200_OK), etag, last_modified)
 
 @swagger_auto_schema(
     method='POST',
     operation_summary='Create new order',
-    operation_description='Creates a new order from the current cart and clears the cart. Total amount is taken from the cart and deducted from user balance.',
+    operation_description='Creates a new order from the current cart and clears the cart. Total amount is taken from the cart and deducted from user balance. '
+                          'Retries sending the same Idempotency-Key get the original response instead of placing another order.',
     request_body=OrderCreateSerializer,
+    manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
     responses={
         201: OrderSerializer,
         400: "Bad Request - Invalid data, empty cart, or insufficient balance",
@@ -86,6 +126,7 @@ def order_detail(request, order_id):
 )
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('create_order')
 def create_order(request):
     """
     Create a new order from the current cart.
@@ -100,17 +141,14 @@ def create_order(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Check if cart exists and has items
+    # Write any pending cart changes held by the cart storage to the database,
+    # then check if cart exists and has items
+    cart_storage = get_cart_storage()
     try:
-        cart = Cart.objects.get(user=user)
-        cart_items = CartItem.objects.filter(cart=cart)
-        
-        if not cart_items.exists():
-            return Response(
-                {"detail": "Your cart is empty. Please add items to your cart before placing an order."}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-    except Cart.DoesNotExist:
+        cart = cart_storage.flush(user)
+    except CartItemError as exc:
+        return Response({"detail": exc.detail}, status=exc.status_code)
+    if cart is None or not CartItem.objects.filter(cart=cart).exists():
         return Response(
             {"detail": "Your cart is empty. Please add items to your cart before placing an order."}, 
             status=status.HTTP_400_BAD_REQUEST
@@ -126,47 +164,18 @@ def create_order(request):
     # Validate order shipping data
     serializer = OrderCreateSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
-        with transaction.atomic():
-            # Create the order using the cart's total amount
-            order = serializer.save(total_amount=cart.total_amount)
-            
-            # Create order items from cart items
-            for cart_item in cart_items:
-                # Check if there's enough stock
-                if cart_item.quantity > cart_item.product.stock:
-                    return Response({
-                        "detail": f"Not enough stock for '{cart_item.product.name}'. Available: {cart_item.product.stock}"
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Create order item
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price
-                )
-                
-                # Update product stock
-                cart_item.product.stock -= cart_item.quantity
-                cart_item.product.save()
-            
-            # Ensure the total_amount is correct based on the actual items
-            order.recalculate_total()
-            
-            # Deduct the total from user's balance
-            if not user.profile.withdraw(order.total_amount):
-                raise Exception("Failed to withdraw funds from user balance")
-            
-            # Clear the cart
-            cart_items.delete()
-            # Reset cart total to zero after emptying
-            cart.total_amount = 0
-            cart.save()
-            
-            # Fetch the order with updated total_amount
-            order.refresh_from_db()
-            
-            return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+        # Stock, balance and order items are written set-based in one transaction
+        try:
+            order = checkout(user, cart, serializer)
+        except CheckoutError as exc:
+            return Response({"detail": exc.detail}, status=status.HTTP_400_BAD_REQUEST)
+        order = Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        ).get(pk=order.pk)
+        ordered = {item.product_id: item.quantity for item in order.items.all()}
+        transaction.on_commit(lambda: cart_storage.discard(user, ordered))
+        
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -201,48 +210,229 @@ def cancel_order(request, order_id):
         return Response({"detail": "Admin users do not have orders to cancel."}, 
                       status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        order = Order.objects.get(id=order_id, user=user)
-    except Order.DoesNotExist:
-        return Response({"detail": "Order not found."}, status=status.HTTP_404_NOT_FOUND)
-    
-    # Check if order is already cancelled
-    if order.status == 'CANCELLED':
-        return Response({"detail": "Order is already cancelled."}, 
-                      status=status.HTTP_400_BAD_REQUEST)
-    
-    # Check if order can be cancelled
-    if order.status in ['SHIPPED', 'DELIVERED']:
-        return Response({"detail": "Cannot cancel an order that has been shipped or delivered."}, 
-                      status=status.HTTP_400_BAD_REQUEST)
-    
     with transaction.atomic():
-        # Return items to inventory
-        order_items = OrderItem.objects.filter(order=order)
-        for item in order_items:
-            item.product.stock += item.quantity
-            item.product.save()
+        # Lock the order so concurrent cancellations (or a bulk cancel) see each other's status
+        order = Order.objects.select_for_update().filter(id=order_id, user=user).values(
+            'id', 'status', 'user_id', 'total_amount'
+        ).first()
+        if order is None:
+            return Response({"detail": "Order not found."}, status=status.HTTP_404_NOT_FOUND)
         
-        # Ensure the total_amount is correct before refunding
-        if order.total_amount == 0:
-            order.recalculate_total()
+        # Check if order is already cancelled
+        if order['status'] == 'CANCELLED':
+            return Response({"detail": "Order is already cancelled."}, 
+                          status=status.HTTP_400_BAD_REQUEST)
         
-        # Refund to user's balance
-        refund_amount = order.total_amount
-        refund_description = f"Refund for cancelled order #{order.id}"
+        # Check if order can be cancelled
+        if order['status'] in ['SHIPPED', 'DELIVERED']:
+            return Response({"detail": "Cannot cancel an order that has been shipped or delivered."}, 
+                          status=status.HTTP_400_BAD_REQUEST)
         
-        # Refund the amount to user's balance
-        if not user.profile.refund(refund_amount, refund_description):
-            return Response(
-                {"detail": "Failed to process refund."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Update order status
-        order.status = 'CANCELLED'
-        order.save()
+        # Restock, refund and remove from the sales rollups with set-based updates, as bulk cancellation does
+        refund_amount = OrderStatusUpdater('CANCELLED').cancel([order])[order['id']]
+        Order.objects.filter(id=order['id']).update(status='CANCELLED', updated_at=timezone.now())
     
     return Response(
         {"detail": f"Order cancelled successfully. Amount refunded: {refund_amount}"},
         status=status.HTTP_200_OK
     )
+
+# API endpoint to change the status of many orders at once
+# Orders are selected by id or by a filter, transitions are validated per order and applied with
+# chunked set-based UPDATEs; cancellations restock and refund in batches.
+# Only accessible to admin users
+@swagger_auto_schema(
+    method='POST',
+    operation_summary='Bulk update order status (Admin Only)',
+    operation_description='Moves the selected orders to the given status. Allowed transitions: '
+                          'PENDING -> PROCESSING/CANCELLED, PROCESSING -> SHIPPED/CANCELLED, SHIPPED -> DELIVERED. '
+                          'Cancelled orders are returned to inventory and refunded. Returns the result of every order.',
+    request_body=OrderBulkStatusSerializer,
+    responses={
+        200: openapi.Response(
+            description='Per-order results',
+            examples={'application/json': {'status': 'SHIPPED', 'updated': 1, 'failed': 1, 'results': [
+                {'id': 12, 'result': 'updated'},
+                {'id': 13, 'result': 'failed', 'detail': 'Cannot change status from DELIVERED to SHIPPED.'}
+            ]}}
+        ),
+        400: "Bad Request - Invalid data",
+        403: "Forbidden - Admin only",
+        401: "Unauthorized - Authentication required"
+    }
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_update_order_status(request):
+    # Check if user is admin
+    if not request.user.is_staff:
+        return Response(
+            {"detail": "You do not have permission to perform this action."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    serializer = OrderBulkStatusSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+    
+    updater = OrderStatusUpdater(data['status'])
+    if 'order_ids' in data:
+        report = updater.run_ids(data['order_ids'])
+    else:
+        report = updater.run_filter(apply_order_filters(Order.objects.all(), data['filter']))
+    return Response(report, status=status.HTTP_200_OK)
+
+# API endpoint to export orders with their items as CSV or NDJSON
+# The response is streamed from a server-side cursor, so memory use stays flat however many rows match
+# Only accessible to admin users
+@swagger_auto_schema(
+    method='GET',
+    operation_summary='Export orders (Admin Only)',
+    operation_description='Streams orders with their items as CSV (one line per order item) or NDJSON (one order per line). '
+                          'Product and category filters select order lines.',
+    manual_parameters=[
+        openapi.Parameter('file_format', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(FILE_FORMATS),
+                          description="Export format (default: csv)"),
+        openapi.Parameter('created_after', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+                          description="Only orders created at or after this ISO 8601 date/time"),
+        openapi.Parameter('created_before', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+                          description="Only orders created before this ISO 8601 date/time"),
+        openapi.Parameter('status', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=[choice for choice, _ in Order.STATUS_CHOICES],
+                          description="Only orders with this status"),
+        openapi.Parameter('product', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Only lines of this product"),
+        openapi.Parameter('category', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Only lines of products in this category"),
+        openapi.Parameter('include_archived', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN, description="Also export archived orders"),
+    ],
+    responses={
+        200: openapi.Response(description='Streamed CSV or NDJSON file'),
+        400: "Bad Request - Invalid filters or format",
+        403: "Forbidden - Admin only",
+        401: "Unauthorized - Authentication required"
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_orders_view(request):
+    # Check if user is admin
+    if not request.user.is_staff:
+        return Response(
+            {"detail": "You do not have permission to perform this action."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    filters = OrderExportFilterSerializer(data=request.GET)
+    if not filters.is_valid():
+        return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+    filters = dict(filters.validated_data)
+    file_format = filters.pop('file_format')
+    include_archived = filters.pop('include_archived')
+    
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export_orders(file_format, filters, include_archived), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="orders.{file_format}"'
+    return response
+
+SALES_RANGE_PARAMETERS = [
+    openapi.Parameter('start', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                      description="First day (default: 29 days before end)"),
+    openapi.Parameter('end', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                      description="Last day, inclusive (default: today)"),
+]
+SALES_TOP_PARAMETERS = [
+    openapi.Parameter('order_by', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['revenue', 'units'],
+                      description="Rank by revenue or units sold (default: revenue)"),
+    openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Number of results (default 10, max 100)"),
+]
+SALES_RESPONSES = {
+    400: "Bad Request - Invalid parameters",
+    403: "Forbidden - Admin only",
+    401: "Unauthorized - Authentication required"
+}
+
+def sales_query(request):
+    """
+    Validate the query parameters of a sales view, returning (params, error response)
+    """
+    if not request.user.is_staff:
+        return None, Response(
+            {"detail": "You do not have permission to perform this action."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    serializer = SalesQuerySerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return None, Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return serializer.validated_data, None
+
+# API endpoint for daily sales totals
+# Read from the daily rollup tables (orders.sales), never from order lines
+# Only accessible to admin users
+@swagger_auto_schema(
+    method='GET',
+    operation_summary='Daily sales (Admin Only)',
+    operation_description='Units sold and revenue per day, excluding cancelled orders, '
+                          'for the whole shop, one product or one category. Days without sales are omitted.',
+    manual_parameters=SALES_RANGE_PARAMETERS + [
+        openapi.Parameter('product', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Only this product"),
+        openapi.Parameter('category', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Only this category"),
+    ],
+    responses={200: openapi.Response(description='Sales per day'), **SALES_RESPONSES}
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sales_daily(request):
+    params, error = sales_query(request)
+    if error:
+        return error
+    return Response({
+        'start': params['start'],
+        'end': params['end'],
+        'results': daily_sales(params['start'], params['end'], params.get('product'), params.get('category')),
+    })
+
+# API endpoint for best-selling products
+# Only accessible to admin users
+@swagger_auto_schema(
+    method='GET',
+    operation_summary='Top products (Admin Only)',
+    operation_description='Best-selling products over the given days, ranked by revenue or units, excluding cancelled orders.',
+    manual_parameters=SALES_RANGE_PARAMETERS + SALES_TOP_PARAMETERS + [
+        openapi.Parameter('category', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description="Only products currently in this category (with all their sales, unlike the category reports)"),
+    ],
+    responses={200: openapi.Response(description='Products with units and revenue'), **SALES_RESPONSES}
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sales_products(request):
+    params, error = sales_query(request)
+    if error:
+        return error
+    return Response({
+        'start': params['start'],
+        'end': params['end'],
+        'results': top_products(
+            params['start'], params['end'], params['order_by'], params['limit'], params.get('category'),
+        ),
+    })
+
+# API endpoint for best-selling categories
+# Only accessible to admin users
+@swagger_auto_schema(
+    method='GET',
+    operation_summary='Top categories (Admin Only)',
+    operation_description='Best-selling categories over the given days, ranked by revenue or units, excluding cancelled orders.',
+    manual_parameters=SALES_RANGE_PARAMETERS + SALES_TOP_PARAMETERS,
+    responses={200: openapi.Response(description='Categories with units and revenue'), **SALES_RESPONSES}
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sales_categories(request):
+    params, error = sales_query(request)
+    if error:
+        return error
+    return Response({
+        'start': params['start'],
+        'end': params['end'],
+        'results': top_categories(params['start'], params['end'], params['order_by'], params['limit']),
+    })
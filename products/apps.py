@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PorductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        # Connect the search index, catalog cache, image pipeline and price change signal handlers
+        from . import cache, images, search, signals
+        post_migrate.connect(search.create_search_index, sender=self)
@@ -0,0 +1,200 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import transaction
+
+from .cache import bump_catalog_version
+from .models import Category, Product
+from .search import index_products
+from .serializers import ProductImportSerializer
+from .signals import send_prices_changed
+
+EXPORT_FIELDS = ['id', 'name', 'description', 'price', 'stock', 'category', 'created_at']
+IMPORT_FIELDS = ['id', 'name', 'description', 'price', 'stock', 'category']
+FILE_FORMATS = ('csv', 'ndjson')
+
+# Only the first errors are reported so memory stays bounded on bad files
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+def iter_csv_rows(fileobj):
+    reader = csv.DictReader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+    unknown = set(reader.fieldnames or []) - set(IMPORT_FIELDS)
+    if unknown:
+        raise ImportFormatError(f"Unknown columns: {', '.join(sorted(unknown))}")
+    for row in reader:
+        # Empty cells mean "not provided", so partial updates leave those fields untouched
+        yield {key: value for key, value in row.items() if value != ''}
+
+
+def iter_ndjson_rows(fileobj):
+    for line in io.TextIOWrapper(fileobj, encoding='utf-8'):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else {'__invalid__': line[:100]}
+
+
+def iter_rows(fileobj, file_format):
+    if file_format == 'csv':
+        return iter_csv_rows(fileobj)
+    if file_format == 'ndjson':
+        return iter_ndjson_rows(fileobj)
+    raise ImportFormatError(f"Unsupported format '{file_format}'. Use one of: {', '.join(FILE_FORMATS)}")
+
+
+class ProductImporter:
+    """
+    Streams rows from an upload and upserts them in chunked transactions.
+
+    Every batch is validated in memory, then written with one bulk_create and
+    one bulk_update per set of updated fields. A failing row is reported and
+    skipped without affecting the rest of its batch.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.category_ids = set(Category.objects.values_list('id', flat=True))
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        rows = enumerate(rows, start=1)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+        if self.created or self.updated:
+            transaction.on_commit(bump_catalog_version)
+        return self.report()
+
+    def report(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def validate(self, row_number, row):
+        if '__invalid__' in row:
+            self.add_error(row_number, {'row': ['Invalid JSON object.']})
+            return None
+        serializer = ProductImportSerializer(data=row, partial='id' in row)
+        if not serializer.is_valid():
+            self.add_error(row_number, serializer.errors)
+            return None
+        data = serializer.validated_data
+        if 'category' in data and data['category'] not in self.category_ids:
+            self.add_error(row_number, {'category': [f"Category {data['category']} does not exist."]})
+            return None
+        return data
+
+    def import_batch(self, batch):
+        creates, updates = [], []
+        for row_number, row in batch:
+            data = self.validate(row_number, row)
+            if data is None:
+                continue
+            if 'id' in data:
+                updates.append((row_number, data))
+            else:
+                creates.append(data)
+
+        existing = dict(
+            Product.objects.filter(id__in=[data['id'] for _, data in updates]).values_list('id', 'price')
+        )
+        update_groups = {}
+        repriced = []
+        for row_number, data in updates:
+            if data['id'] not in existing:
+                self.add_error(row_number, {'id': [f"Product {data['id']} does not exist."]})
+                continue
+            if 'price' in data and data['price'] != existing[data['id']]:
+                repriced.append(data['id'])
+            fields = tuple(sorted(name for name in data if name != 'id'))
+            update_groups.setdefault(fields, []).append(self.build_product(data))
+
+        with transaction.atomic():
+            new_products = Product.objects.bulk_create([self.build_product(data) for data in creates])
+            reindex = list(new_products)
+            for fields, products in update_groups.items():
+                if fields:
+                    Product.objects.bulk_update(products, [self.model_field(f) for f in fields])
+                if {'name', 'description'} & set(fields):
+                    reindex.extend(products)
+
+            # Bulk writes skip the post_save handlers, so keep the search index in sync here.
+            # Updated rows may be partial, index them from the stored values.
+            index_products(
+                Product.objects.filter(id__in=[p.pk for p in reindex]).only('id', 'name', 'description')
+            )
+            send_prices_changed(repriced)
+
+        self.created += len(new_products)
+        self.updated += sum(len(products) for products in update_groups.values())
+
+    @staticmethod
+    def model_field(name):
+        return 'category_id' if name == 'category' else name
+
+    def build_product(self, data):
+        values = {self.model_field(name): value for name, value in data.items()}
+        return Product(**values)
+
+
+def import_products(fileobj, file_format, batch_size=1000):
+    """
+    Import products from a CSV or NDJSON file object and return a report
+    """
+    return ProductImporter(batch_size=batch_size).run(iter_rows(fileobj, file_format))
+
+
+class _Echo:
+    """
+    File-like object that hands back what is written, for streaming csv output
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_products(file_format, chunk_size=2000):
+    """
+    Yield the catalog as CSV or NDJSON lines without loading it into memory
+    """
+    rows = Product.objects.order_by('id').values_list(
+        'id', 'name', 'description', 'price', 'stock', 'category_id', 'created_at'
+    ).iterator(chunk_size=chunk_size)
+
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(row[:6] + (row[6].isoformat(),))
+    elif file_format == 'ndjson':
+        for row in rows:
+            record = dict(zip(EXPORT_FIELDS, row))
+            record['price'] = str(record['price'])
+            record['created_at'] = record['created_at'].isoformat()
+            yield json.dumps(record) + '\n'
+    else:
+        raise ImportFormatError(f"Unsupported format '{file_format}'. Use one of: {', '.join(FILE_FORMATS)}")
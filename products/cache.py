@@ -0,0 +1,204 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, Product
+from .serializers import PRODUCT_VALUE_FIELDS, ProductReadSerializer
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_MODIFIED_KEY = 'catalog:modified'
+STOCK_MODIFIED_KEY = 'catalog:stock:modified'
+CACHE_HITS_KEY = 'catalog:stats:hits'
+CACHE_MISSES_KEY = 'catalog:stats:misses'
+
+# Query parameters that affect a listing response, anything else is ignored
+# so that e.g. tracking parameters don't fragment the cache
+LISTING_PARAMS = (
+    'category', 'price', 'price_min', 'price_max', 'in_stock', 'created_after',
+    'search', 'ordering', 'page', 'page_size', 'pagination', 'cursor', 'with_count',
+    'facets',
+)
+
+
+def _initial_version():
+    # Start from the clock rather than 1 so a version counter evicted from the
+    # cache never comes back at a value that older entries were stored under
+    return time.time_ns() // 1000
+
+
+def get_catalog_version():
+    """
+    Return the current catalog version, every catalog write moves it forward
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, _initial_version(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, _initial_version())
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalidate all cached catalog responses by moving to a new version
+    """
+    cache.set(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        version = _initial_version()
+        cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+        return version
+
+
+def get_catalog_last_modified(stock=False):
+    """
+    Return when the catalog last changed. If that is no longer known
+    (e.g. the cache was flushed) the current time is assumed from then on.
+    With stock=True stock changes (see invalidate_product_stock) count too.
+    """
+    modified = cache.get(CATALOG_MODIFIED_KEY)
+    if modified is None:
+        cache.add(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+        modified = cache.get(CATALOG_MODIFIED_KEY, time.time())
+    if stock:
+        modified = max(modified, cache.get(STOCK_MODIFIED_KEY, 0))
+    return datetime.fromtimestamp(int(modified), tz=timezone.utc)
+
+
+def invalidate_product_stock(product_ids):
+    """
+    Drop the cached representations of products whose stock changed (orders
+    and cancellations) without moving the catalog version, so listings,
+    category choices and every other product stay cached. Listings keep
+    their stale stock values, views replace them with refresh_stock().
+    """
+    cache.set(STOCK_MODIFIED_KEY, time.time(), timeout=None)
+    version = get_catalog_version()
+    cache.delete_many([product_cache_key(product_id, version) for product_id in product_ids])
+
+
+def _incr(key, delta=1):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def listing_cache_key(name, request):
+    """
+    Build the cache key of a listing from its normalized query parameters
+    """
+    params = []
+    for param in LISTING_PARAMS:
+        value = request.GET.get(param, '').strip()
+        if param == 'search':
+            value = ' '.join(value.lower().split())
+        if value:
+            params.append(f'{param}={value}')
+    # Pagination links are absolute URLs so the host is part of the response
+    raw = '&'.join([request.get_host()] + params)
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'catalog:v{get_catalog_version()}:{name}:{digest}'
+
+
+def get_cached_listing(key):
+    """
+    Return the cached response data for key or None, recording a hit or miss
+    """
+    data = cache.get(key)
+    _incr(CACHE_MISSES_KEY if data is None else CACHE_HITS_KEY)
+    return data
+
+
+def set_cached_listing(key, data):
+    cache.set(key, data, timeout=getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+
+
+def product_cache_key(product_id, version):
+    return f'catalog:v{version}:product:{product_id}'
+
+
+def get_cached_products(product_ids):
+    """
+    Return {id: representation} for the products found in the cache,
+    recording a hit or miss per product
+    """
+    version = get_catalog_version()
+    keys = {product_cache_key(product_id, version): product_id for product_id in product_ids}
+    found = cache.get_many(keys.keys())
+    _incr(CACHE_HITS_KEY, len(found))
+    _incr(CACHE_MISSES_KEY, len(keys) - len(found))
+    return {keys[key]: data for key, data in found.items()}
+
+
+def set_cached_products(products):
+    """
+    Cache product representations given as {id: representation}
+    """
+    version = get_catalog_version()
+    cache.set_many(
+        {product_cache_key(product_id, version): data for product_id, data in products.items()},
+        timeout=getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300),
+    )
+
+
+def get_products_by_ids(product_ids):
+    """
+    Read-through lookup of product representations: cached products come
+    from the cache, the rest are fetched with a single id__in query and cached.
+    Returns {id: representation} for the products that exist.
+    """
+    products = get_cached_products(product_ids)
+    missing = [product_id for product_id in product_ids if product_id not in products]
+    if missing:
+        rows = Product.objects.filter(id__in=missing).values(*PRODUCT_VALUE_FIELDS)
+        fetched = {data['id']: data for data in ProductReadSerializer(rows, many=True).data}
+        set_cached_products(fetched)
+        products.update(fetched)
+    return products
+
+
+def refresh_stock(rows):
+    """
+    Replace the stock of cached product representations with the current
+    values from the product cache, in place
+    """
+    products = get_products_by_ids([row['id'] for row in rows])
+    for row in rows:
+        if row['id'] in products:
+            row['stock'] = products[row['id']]['stock']
+    return rows
+
+
+def get_cache_stats():
+    hits = cache.get(CACHE_HITS_KEY, 0)
+    misses = cache.get(CACHE_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'catalog_version': get_catalog_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Any product or category change makes every cached listing stale.
+    The bump waits for the commit so no reader can cache pre-commit data
+    under the new version.
+    """
+    transaction.on_commit(bump_catalog_version)
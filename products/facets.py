@@ -0,0 +1,69 @@
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .filters import ProductFilter
+from .models import Product
+from .search import search_products
+
+# Lower bounds of the price histogram buckets, the last bucket is open ended
+PRICE_BUCKETS = (0, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _facet_queryset(params, exclude, search_query):
+    # A facet ignores its own filter so the widget still offers the other
+    # values, while every other active filter (and the search) still applies
+    params = params.copy()
+    for name in exclude:
+        params.pop(name, None)
+    products = ProductFilter(params, queryset=Product.objects.all()).qs
+    if search_query:
+        products = search_products(products, search_query, rank=False)
+    return products.order_by()
+
+
+def category_facet(params, search_query=None):
+    """
+    Number of matching products per category, computed in one grouped query
+    """
+    rows = (
+        _facet_queryset(params, ('category',), search_query)
+        .values('category_id', 'category__name')
+        .annotate(count=Count('id'))
+        .order_by('category__name')
+    )
+    return [
+        {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def price_facet(params, search_query=None):
+    """
+    Histogram of matching products over PRICE_BUCKETS, computed in one grouped query
+    """
+    bucket = Case(
+        *[When(price__gte=low, then=Value(i)) for i, low in reversed(list(enumerate(PRICE_BUCKETS)))],
+        output_field=IntegerField(),
+    )
+    rows = (
+        _facet_queryset(params, ('price', 'price_min', 'price_max'), search_query)
+        .annotate(bucket=bucket)
+        .values('bucket')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    counts = {row['bucket']: row['count'] for row in rows}
+    return [
+        {
+            'min': low,
+            'max': PRICE_BUCKETS[i + 1] if i + 1 < len(PRICE_BUCKETS) else None,
+            'count': counts.get(i, 0),
+        }
+        for i, low in enumerate(PRICE_BUCKETS)
+    ]
+
+
+def build_facets(params, search_query=None):
+    return {
+        'categories': category_facet(params, search_query),
+        'price': price_facet(params, search_query),
+    }
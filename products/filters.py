@@ -0,0 +1,35 @@
+from django_filters import rest_framework as filters
+
+from .models import Product
+
+# Sort keys accepted by the product listing (ascending or with '-' for descending).
+# Each one is backed by composite indexes on Product, see Product.Meta.indexes.
+PRODUCT_ORDERING_FIELDS = ('created_at', 'price', 'name')
+PRODUCT_ORDERINGS = [key for field in PRODUCT_ORDERING_FIELDS for key in (field, '-' + field)]
+
+
+class ProductFilter(filters.FilterSet):
+    """
+    Filters accepted by the product listing
+    """
+    category = filters.NumberFilter(field_name='category_id')
+    price = filters.NumberFilter(field_name='price')
+    price_min = filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = filters.NumberFilter(field_name='price', lookup_expr='lte')
+    in_stock = filters.BooleanFilter(method='filter_in_stock')
+    created_after = filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    ordering = filters.ChoiceFilter(choices=[(key, key) for key in PRODUCT_ORDERINGS], method='filter_ordering')
+
+    class Meta:
+        model = Product
+        fields = ['category', 'price', 'price_min', 'price_max', 'in_stock', 'created_after', 'ordering']
+
+    def filter_in_stock(self, queryset, name, value):
+        if value:
+            return queryset.filter(stock__gt=0)
+        return queryset.filter(stock=0)
+
+    def filter_ordering(self, queryset, name, value):
+        # id breaks ties so pages are stable and the sort matches the (field, id) indexes
+        tie_breaker = '-id' if value.startswith('-') else 'id'
+        return queryset.order_by(value, tie_breaker)
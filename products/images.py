@@ -0,0 +1,115 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+from .cache import bump_catalog_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Derivatives generated for every product image: name -> (bounding box, format)
+IMAGE_VARIANTS = {
+    'thumbnail': ((200, 200), 'JPEG'),
+    'thumbnail_webp': ((200, 200), 'WEBP'),
+    'medium_webp': ((800, 800), 'WEBP'),
+}
+VARIANT_EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+VARIANTS_DIR = 'product_images/variants'
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    """
+    Return the worker pool that renders image derivatives off the request path
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2),
+                thread_name_prefix='product-images',
+            )
+    return _executor
+
+
+def render_variant(image, size, image_format):
+    """
+    Resize image to fit into size and encode it, returning the bytes
+    """
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    buffer = BytesIO()
+    variant.save(buffer, format=image_format, quality=82, optimize=True)
+    return buffer.getvalue()
+
+
+def store_variant(content, image_format):
+    """
+    Store an encoded variant under a content-hashed name, identical variants
+    share a single file
+    """
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    name = f'{VARIANTS_DIR}/{digest}.{VARIANT_EXTENSIONS[image_format]}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name
+
+
+def generate_image_variants(product_id, image_name):
+    """
+    Render and store all derivatives of a product image and record them on the product
+    """
+    try:
+        with default_storage.open(image_name, 'rb') as source:
+            image = ImageOps.exif_transpose(Image.open(source))
+            image.load()
+
+        variants = {'source': image_name}
+        for variant_name, (size, image_format) in IMAGE_VARIANTS.items():
+            variants[variant_name] = store_variant(render_variant(image, size, image_format), image_format)
+
+        # Only record the variants if the product still has the image they were made from
+        updated = Product.objects.filter(pk=product_id, image=image_name).update(image_variants=variants)
+        if updated:
+            bump_catalog_version()
+    except Exception:
+        logger.exception('Generating image variants failed for product %s (%s)', product_id, image_name)
+    finally:
+        close_old_connections()
+
+
+def schedule_image_variants(product):
+    """
+    Queue derivative generation for the product's current image once the
+    surrounding transaction has committed
+    """
+    product_id, image_name = product.pk, product.image.name
+    transaction.on_commit(lambda: get_executor().submit(generate_image_variants, product_id, image_name))
+
+
+@receiver(post_save, sender=Product)
+def process_product_image(sender, instance, **kwargs):
+    """
+    Generate derivatives whenever a product gets a new image and drop them
+    when the image is removed
+    """
+    if instance.image:
+        if instance.image_variants.get('source') != instance.image.name:
+            schedule_image_variants(instance)
+    elif instance.image_variants:
+        Product.objects.filter(pk=instance.pk).update(image_variants={})
+        instance.image_variants = {}
@@ -0,0 +1,74 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from products.models import Product
+from products.serializers import PRODUCT_VALUE_FIELDS, ProductReadSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare ProductSerializer with the fast ProductReadSerializer path on an in-memory page of products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Products per page (default: 100)')
+        parser.add_argument('--repeat', type=int, default=200, help='Number of pages serialized per path')
+
+    def build_products(self, count):
+        now = timezone.now()
+        return [
+            Product(
+                id=i,
+                name=f'Product {i}',
+                description='Benchmark product ' * 5,
+                price=Decimal(i) + Decimal('0.99'),
+                stock=i % 50,
+                category_id=i % 10 + 1,
+                image=f'product_images/product_{i}.png' if i % 2 else None,
+                image_variants={'source': f'product_images/product_{i}.png',
+                                'thumbnail': f'product_images/variants/{i:032x}.jpg'} if i % 2 else {},
+                created_at=now - timedelta(minutes=i),
+            )
+            for i in range(1, count + 1)
+        ]
+
+    def time_path(self, serialize, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            serialize()
+        return (time.perf_counter() - start) / repeat
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        products = self.build_products(rows)
+        # The listing feeds .values() rows to the fast path, mimic them here
+        value_rows = [
+            {field: getattr(product, 'image' if field == 'image' else field) for field in PRODUCT_VALUE_FIELDS}
+            for product in products
+        ]
+        for row, product in zip(value_rows, products):
+            row['image'] = product.image.name
+
+        renderer = JSONRenderer()
+        baseline = renderer.render(ProductSerializer(products, many=True).data)
+        fast_instances = renderer.render(ProductReadSerializer(products, many=True).data)
+        fast_rows = renderer.render(ProductReadSerializer(value_rows, many=True).data)
+        if not baseline == fast_instances == fast_rows:
+            self.stderr.write(self.style.ERROR('Fast path output differs from ProductSerializer output.'))
+            return
+
+        timings = [
+            ('ProductSerializer', self.time_path(lambda: ProductSerializer(products, many=True).data, repeat)),
+            ('ProductReadSerializer (instances)',
+             self.time_path(lambda: ProductReadSerializer(products, many=True).data, repeat)),
+            ('ProductReadSerializer (.values() rows)',
+             self.time_path(lambda: ProductReadSerializer(value_rows, many=True).data, repeat)),
+        ]
+
+        self.stdout.write(f'Output is byte-identical ({len(baseline)} bytes per page of {rows} products).')
+        base = timings[0][1]
+        for label, seconds in timings:
+            self.stdout.write(f'{label:<40} {seconds * 1000:8.3f} ms/page  {base / seconds:5.1f}x')
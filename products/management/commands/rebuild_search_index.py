@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import index_products, uses_native_search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of products indexed per batch')
+
+    def handle(self, *args, **options):
+        if uses_native_search():
+            self.stdout.write('PostgreSQL full-text index is maintained by the database, nothing to rebuild.')
+            return
+
+        batch_size = options['batch_size']
+        batch = []
+        indexed = 0
+        for product in Product.objects.only('id', 'name', 'description').iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                index_products(batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            index_products(batch)
+            indexed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} products.'))
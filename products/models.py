@@ -15,6 +15,16 @@ class Product(models.Model):
 
     class Meta:
         __name__ = 'product'
+        # Support the sort keys allowed by the product listing (see products.filters),
+        # alone and within a category, with id as tie-breaker
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_cat_created_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='product_cat_price_idx'),
+            models.Index(fields=['category', 'name', 'id'], name='product_cat_name_idx'),
+        ]
 
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -22,8 +32,32 @@ class Product(models.Model):
     stock = models.PositiveIntegerField(default=0)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     image = models.ImageField(upload_to='product_images/', blank=True, null=True)
+    # Storage names of the resized/WebP derivatives of `image`, filled in asynchronously
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored price so saves can tell whether it changed (see products.signals)
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
+class ProductSearchTerm(models.Model):
+    """
+    Inverted index entry used for product search on databases
+    without native full-text search (e.g. SQLite)
+    """
+
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('term', 'product')
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
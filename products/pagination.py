@@ -0,0 +1,193 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor based pagination over the queryset ordering with `id` as tie-breaker.
+
+    Pages are fetched with a `WHERE (key, id) > (last_key, last_id)` range
+    condition instead of an OFFSET, so deep pages cost the same as the first one.
+    The total count is only computed when explicitly requested. NULL keys
+    sort after all values (before them when descending), as in PostgreSQL.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    tie_breaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request)
+
+    def paginate_querysets(self, querysets, request):
+        """
+        Paginate several querysets with the same ordering (e.g. a table and its
+        archive) as one sequence. Each one fetches at most a page from its own
+        index and the pages are merged, so ids must be unique across them.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(querysets[0])
+        self.model_field = self.get_model_field(querysets[0].model, self.field)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = sum(queryset.count() for queryset in querysets)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['r'])
+
+        # Walk backwards by flipping the ordering and reversing the fetched page
+        descending = self.descending != reverse
+        results = []
+        for queryset in querysets:
+            queryset = queryset.order_by(*self.order_by(descending))
+            if cursor:
+                queryset = queryset.filter(self.position_filter(cursor['v'], cursor['id'], descending))
+            results.extend(queryset[:self.page_size + 1])
+        if len(querysets) > 1:
+            results.sort(key=self.sort_key, reverse=descending)
+
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering or ['-' + self.tie_breaker]
+        field = ordering[0]
+        if field.startswith('-'):
+            return field[1:], True
+        return field, False
+
+    @staticmethod
+    def get_model_field(model, name):
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    @property
+    def nullable(self):
+        return self.model_field is not None and self.model_field.null
+
+    def order_by(self, descending):
+        prefix = '-' if descending else ''
+        if self.field == self.tie_breaker:
+            return [prefix + self.field]
+        if self.nullable:
+            key = F(self.field).desc(nulls_first=True) if descending else F(self.field).asc(nulls_last=True)
+            return [key, prefix + self.tie_breaker]
+        return [prefix + self.field, prefix + self.tie_breaker]
+
+    def sort_key(self, obj):
+        value = self.get_value(obj, self.field)
+        return (value is None, 0 if value is None else value, self.get_value(obj, self.tie_breaker))
+
+    def position_filter(self, value, pk, descending):
+        after = 'lt' if descending else 'gt'
+        if self.field == self.tie_breaker:
+            return Q(**{f'{self.tie_breaker}__{after}': pk})
+        if value is None:
+            # NULLs are last when ascending and first when descending
+            following = Q(**{f'{self.field}__isnull': True, f'{self.tie_breaker}__{after}': pk})
+            return following | Q(**{f'{self.field}__isnull': False}) if descending else following
+        position = (
+            Q(**{f'{self.field}__{after}': value})
+            | Q(**{self.field: value, f'{self.tie_breaker}__{after}': pk})
+        )
+        if self.nullable and not descending:
+            position |= Q(**{f'{self.field}__isnull': True})
+        return position
+
+    @staticmethod
+    def get_value(obj, name):
+        # Pages may hold model instances or .values() rows
+        return obj[name] if isinstance(obj, dict) else getattr(obj, name)
+
+    def encode_cursor(self, obj, reverse):
+        value = self.get_value(obj, self.field)
+        position = {
+            'v': value if isinstance(value, (int, float, type(None))) else str(value),
+            'id': self.get_value(obj, self.tie_breaker),
+            'r': reverse,
+        }
+        token = base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if set(position) != {'v', 'id', 'r'} or not isinstance(position['r'], bool):
+                raise ValueError
+            # Tampered or stale values must not reach the query
+            position['id'] = int(position['id'])
+            if position['v'] is None:
+                if not self.nullable and self.field != self.tie_breaker:
+                    raise ValueError
+            elif self.model_field is not None:
+                position['v'] = self.model_field.to_python(position['v'])
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor(self.page[-1], reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor(self.page[0], reverse=True))
+
+
+class ProductCursorPagination(KeysetPagination):
+    page_size = 10
+    max_page_size = 100
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.cache import cache
+from drf_yasg import openapi
+from drf_yasg.inspectors import SwaggerAutoSchema
+
+from .cache import get_catalog_version
+from .models import Category
+
+
+def get_category_choices():
+    """
+    Return [(id, name), ...] of all categories, cached until the catalog changes.
+    Entries expire like catalog listings, so superseded versions do not pile up.
+    """
+    key = f'catalog:v{get_catalog_version()}:category_choices'
+    choices = cache.get(key)
+    if choices is None:
+        choices = list(Category.objects.order_by('id').values_list('id', 'name'))
+        cache.set(key, choices, timeout=getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+    return choices
+
+
+def category_form_parameter(required=True):
+    choices = get_category_choices()
+    return openapi.Parameter(
+        'category',
+        openapi.IN_FORM,
+        description=(
+            "Select a category by its ID. Available categories:\n"
+            + "\n".join([f"- {category_id}: {name}" for category_id, name in choices])
+        ),
+        type=openapi.TYPE_INTEGER,
+        enum=[category_id for category_id, _ in choices],
+        required=required
+    )
+
+
+class CategoryFormAutoSchema(SwaggerAutoSchema):
+    """
+    Adds the `category` form parameter listing the current categories.
+
+    The categories are looked up when the schema is generated instead of when
+    the view module is imported, so importing the views does no database I/O.
+    Pass `category_required=False` to swagger_auto_schema to make it optional.
+    """
+
+    def add_manual_parameters(self, parameters):
+        parameters = super().add_manual_parameters(parameters)
+        category = category_form_parameter(required=self.overrides.get('category_required', True))
+        for i, param in enumerate(parameters):
+            if param.name == category.name and param.in_ == category.in_:
+                parameters[i] = category
+                return parameters
+        return parameters + [category]
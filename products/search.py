@@ -0,0 +1,156 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Product, ProductSearchTerm
+
+# Maximum number of query words taken into account for a single search
+MAX_QUERY_TERMS = 8
+
+# Weights of the inverted index, mirroring the 'A'/'B' weights used on PostgreSQL
+NAME_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+TERM_MAX_LENGTH = ProductSearchTerm._meta.get_field('term').max_length
+
+# Weighted tsvector of a product. The GIN index below is built on exactly this
+# expression so PostgreSQL can answer searches from the index.
+PG_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(products_product.name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(products_product.description, '')), 'B')"
+)
+PG_SEARCH_INDEX_NAME = 'products_product_search_idx'
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def uses_native_search(using='default'):
+    """
+    PostgreSQL searches through its own full-text index, every other
+    database goes through the ProductSearchTerm inverted index
+    """
+    return connections[using].vendor == 'postgresql'
+
+
+def tokenize(text):
+    """
+    Split text into lowercase index terms
+    """
+    return [word[:TERM_MAX_LENGTH] for word in _WORD_RE.findall((text or '').lower())]
+
+
+def build_search_terms(product):
+    """
+    Return the (unsaved) inverted index entries for a product
+    """
+    weights = {}
+    for term in tokenize(product.name):
+        weights[term] = weights.get(term, 0) + NAME_WEIGHT
+    for term in tokenize(product.description):
+        weights[term] = weights.get(term, 0) + DESCRIPTION_WEIGHT
+    return [
+        ProductSearchTerm(product_id=product.pk, term=term, weight=weight)
+        for term, weight in weights.items()
+    ]
+
+
+def index_products(products, using='default'):
+    """
+    Replace the inverted index entries of the given products
+    """
+    if uses_native_search(using):
+        return
+    products = list(products)
+    if not products:
+        return
+    ProductSearchTerm.objects.using(using).filter(product__in=[p.pk for p in products]).delete()
+    terms = []
+    for product in products:
+        terms.extend(build_search_terms(product))
+    ProductSearchTerm.objects.using(using).bulk_create(terms, batch_size=1000)
+
+
+def search_products(queryset, query, rank=True):
+    """
+    Restrict queryset to products matching the search query. With `rank`
+    each product is also annotated with a `search_rank` (higher is more relevant).
+    """
+    if uses_native_search(queryset.db):
+        return _search_postgres(queryset, query, rank)
+    return _search_inverted_index(queryset, query, rank)
+
+
+def _search_postgres(queryset, query, rank):
+    tsquery = "websearch_to_tsquery('english', %s)"
+    queryset = queryset.filter(
+        RawSQL(f"({PG_SEARCH_DOCUMENT}) @@ {tsquery}", [query], output_field=BooleanField())
+    )
+    if not rank:
+        return queryset
+    return queryset.annotate(
+        search_rank=RawSQL(f"ts_rank({PG_SEARCH_DOCUMENT}, {tsquery})", [query], output_field=FloatField())
+    )
+
+
+def _term_lookup(term, prefix):
+    # A prefix match is expressed as a range so it stays an index range scan
+    if prefix:
+        return Q(term__gte=term, term__lt=term + '\uffff')
+    return Q(term=term)
+
+
+def _search_inverted_index(queryset, query, rank):
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        queryset = queryset.none()
+        return queryset.annotate(search_rank=Value(0)) if rank else queryset
+
+    # Every word must match; the last one also matches as a prefix so
+    # partially typed queries still find results
+    lookups = [_term_lookup(term, prefix=(i == len(terms) - 1)) for i, term in enumerate(terms)]
+    for lookup in lookups:
+        queryset = queryset.filter(
+            id__in=ProductSearchTerm.objects.filter(lookup).values('product_id')
+        )
+    if not rank:
+        return queryset
+
+    any_term = Q()
+    for lookup in lookups:
+        any_term |= lookup
+    rank = ProductSearchTerm.objects.filter(any_term, product=OuterRef('pk')).values(
+        'product'
+    ).annotate(total=Sum('weight')).values('total')
+    return queryset.annotate(
+        search_rank=Coalesce(Subquery(rank, output_field=IntegerField()), Value(0))
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_index(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the inverted index in sync whenever a product is created or its
+    searchable fields change. Deleted products lose their entries through
+    the cascading foreign key.
+    """
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    index_products([instance], using=kwargs.get('using') or 'default')
+
+
+def create_search_index(using='default', **kwargs):
+    """
+    Create the PostgreSQL GIN index used by full-text search (post_migrate hook)
+    """
+    if not uses_native_search(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {PG_SEARCH_INDEX_NAME} "
+            f"ON products_product USING gin (({PG_SEARCH_DOCUMENT.replace('products_product.', '')}))"
+        )
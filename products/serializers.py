@@ -1,3 +1,6 @@
+from decimal import Decimal
+from django.core.files.storage import default_storage
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Category, Product
 
@@ -7,7 +10,131 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+def image_variant_urls(image_variants, request=None):
+    """
+    Map the stored image derivative names to their URLs
+    """
+    urls = {}
+    for name, path in image_variants.items():
+        if name == 'source':
+            continue
+        url = default_storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
 class ProductSerializer(serializers.ModelSerializer):
+    # URLs of the generated image derivatives (empty until they are ready)
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    def get_image_variants(self, obj):
+        return image_variant_urls(obj.image_variants, self.context.get('request'))
+
+
+# Columns fetched with .values() for the fast product read path
+PRODUCT_VALUE_FIELDS = (
+    'id', 'image_variants', 'name', 'description', 'price', 'stock', 'image', 'created_at', 'category_id',
+)
+
+# Field instances used only to format values exactly like ProductSerializer does
+_price_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+_datetime_field = serializers.DateTimeField()
+
+
+def _format_datetime(value, tz=None):
+    # Same output as DRF's DateTimeField with the timezone looked up once per page
+    if tz is None or not timezone.is_aware(value):
+        return _datetime_field.to_representation(value)
+    value = value.astimezone(tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def product_row_to_dict(row, request=None, tz=None):
+    """
+    Build the ProductSerializer representation of a `.values(*PRODUCT_VALUE_FIELDS)` row
+    """
+    image = row['image']
+    if image:
+        image = default_storage.url(image)
+        if request is not None:
+            image = request.build_absolute_uri(image)
+    else:
+        image = None
+    return {
+        'id': row['id'],
+        'image_variants': image_variant_urls(row['image_variants'], request),
+        'name': row['name'],
+        'description': row['description'],
+        'price': _price_field.to_representation(row['price']),
+        'stock': row['stock'],
+        'image': image,
+        'created_at': _format_datetime(row['created_at'], tz),
+        'category': row['category_id'],
+    }
+
+
+def product_to_dict(product, request=None, tz=None):
+    """
+    Build the ProductSerializer representation of a Product instance
+    """
+    return product_row_to_dict({
+        'id': product.id,
+        'image_variants': product.image_variants,
+        'name': product.name,
+        'description': product.description,
+        'price': product.price,
+        'stock': product.stock,
+        'image': product.image.name,
+        'created_at': product.created_at,
+        'category_id': product.category_id,
+    }, request, tz)
+
+
+class ProductReadListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        request = self.context.get('request')
+        tz = _datetime_field.default_timezone()
+        return [
+            product_row_to_dict(item, request, tz) if isinstance(item, dict) else product_to_dict(item, request, tz)
+            for item in data
+        ]
+
+
+class ProductReadSerializer(ProductSerializer):
+    """
+    Read-only fast path of ProductSerializer.
+
+    Produces the same output, but builds it directly from a Product instance
+    or a `.values(*PRODUCT_VALUE_FIELDS)` row instead of running every field
+    through DRF. Used for listings and nested product details.
+    """
+
+    class Meta(ProductSerializer.Meta):
+        list_serializer_class = ProductReadListSerializer
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        if isinstance(instance, dict):
+            return product_row_to_dict(instance, request)
+        return product_to_dict(instance, request)
+
+
+class ProductImportSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk product import. Rows with an `id` update
+    that product (only the given fields), rows without one create a product.
+    Category existence is checked by the importer against a preloaded id set.
+    """
+    id = serializers.IntegerField(required=False, min_value=1)
+    name = serializers.CharField(max_length=255)
+    description = serializers.CharField(required=False, allow_blank=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'))
+    stock = serializers.IntegerField(required=False, min_value=0)
+    category = serializers.IntegerField(min_value=1)
@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from .models import Product
+
+# Sent with product_ids after a transaction that changed product prices has committed
+product_prices_changed = Signal()
+
+
+def send_prices_changed(product_ids):
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(
+            lambda: product_prices_changed.send(sender=Product, product_ids=product_ids)
+        )
+
+
+@receiver(post_save, sender=Product)
+def detect_price_change(sender, instance, created, **kwargs):
+    """
+    Announce a changed price of a saved product (bulk writes call send_prices_changed themselves)
+    """
+    loaded_price = getattr(instance, '_loaded_price', None)
+    if not created and loaded_price is not None and loaded_price != instance.price:
+        send_prices_changed([instance.pk])
+    instance._loaded_price = instance.price
@@ -1,3 +1,79 @@
+import base64
+import json
+
+from django.core.cache import cache
+from django.db import transaction
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .cache import get_catalog_version, invalidate_product_stock
+from .models import Category, Product
+
+
+def make_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+
+class ProductCursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Books')
+        for i in range(5):
+            Product.objects.create(name=f'Book {i}', price=10 + i % 3, category=category, stock=1)
+        self.client = APIClient()
+
+    def fetch(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_follow_the_ordering_without_gaps(self):
+        page = self.fetch('/products/list/?ordering=price&pagination=cursor&page_size=2')
+        names = [product['name'] for product in page['results']]
+        while page['next']:
+            page = self.fetch(page['next'])
+            names += [product['name'] for product in page['results']]
+        expected = list(Product.objects.order_by('price', 'id').values_list('name', flat=True))
+        self.assertEqual(names, expected)
+
+    def test_tampered_cursors_are_not_found(self):
+        for position in (
+            {'v': 'abc', 'id': 1, 'r': False},
+            {'v': '10.00', 'id': 'x', 'r': False},
+            {'v': None, 'id': 1, 'r': False},
+            {'v': '10.00', 'id': 1, 'r': 'yes'},
+            {'v': '10.00', 'id': 1},
+        ):
+            response = self.client.get('/products/list/', {'ordering': 'price', 'cursor': make_cursor(position)})
+            self.assertEqual(response.status_code, 404, position)
+        response = self.client.get('/products/list/', {'ordering': 'price', 'cursor': 'not-base64!'})
+        self.assertEqual(response.status_code, 404)
+
+
+class StockCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Books')
+        self.book = Product.objects.create(name='Book', price=5, category=category, stock=10)
+        self.pen = Product.objects.create(name='Pen', price=2, category=category, stock=3)
+        self.client = APIClient()
+
+    def stocks(self, response):
+        return {product['id']: product['stock'] for product in response.json()['results']}
+
+    def test_stock_changes_keep_the_catalog_cache(self):
+        listing = self.client.get('/products/list/')
+        self.client.get(f'/products/{self.book.id}/')
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.book.pk).update(stock=7)
+            transaction.on_commit(lambda: invalidate_product_stock([self.book.id]))
+        self.assertEqual(get_catalog_version(), version)
 
-# Create your tests here.
+        response = self.client.get('/products/list/', HTTP_IF_NONE_MATCH=listing['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(self.stocks(response), {self.book.id: 7, self.pen.id: 3})
+        self.assertEqual(self.client.get('/products/list/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(f'/products/{self.book.id}/').json()['stock'], 7)
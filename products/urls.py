@@ -5,6 +5,11 @@ urlpatterns = [
     path('', views.category_list, name='category_list'),  
     path('list/', views.product_list, name='product_list'),  
     path('add/', views.add_product, name='add_product'),
+    path('batch/', views.product_batch, name='product-batch'),
+    path('<int:product_id>/', views.product_detail, name='product-detail'),
     path('products/<int:product_id>/', views.update_product, name='update-product'),
     path('products/<int:product_id>/delete/', views.delete_product, name='delete-product'), 
+    path('import/', views.import_products_view, name='import-products'),
+    path('export/', views.export_products_view, name='export-products'),
+    path('cache/stats/', views.cache_stats, name='catalog-cache-stats'),
 ]
@@ -1,13 +1,25 @@
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, parser_classes, permission_classes
 from .models import Category, Product 
-from .serializers import CategorySerializer, ProductSerializer
+from .serializers import CategorySerializer, ProductSerializer, ProductReadSerializer, PRODUCT_VALUE_FIELDS
+from .search import search_products
+from .filters import ProductFilter, PRODUCT_ORDERINGS
+from .facets import build_facets
+from .schema import CategoryFormAutoSchema
+from .bulk import import_products, export_products, ImportFormatError, FILE_FORMATS
+from .pagination import ProductCursorPagination
+from .cache import (
+    get_cached_listing, set_cached_listing, listing_cache_key, get_cache_stats,
+    get_catalog_last_modified, get_catalog_version, get_products_by_ids, refresh_stock
+)
+from MyShop.conditional import make_etag, not_modified_response, set_validators
 from rest_framework import status
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
 from rest_framework.permissions import IsAuthenticated
 
 # Custom permission class for admin-only operations
@@ -26,7 +38,8 @@ class ProductPagination(PageNumberPagination):
     max_page_size = 100
 
 # API endpoint to retrieve all categories
-# Returns a list of all available product categories
+# Returns a list of all available product categories (served from the catalog cache when warm)
+# Supports conditional GET: repeat requests get 304 Not Modified while the catalog is unchanged
 @swagger_auto_schema(
     method='GET',
     operation_summary='Get Category Details',
@@ -40,64 +53,227 @@ class ProductPagination(PageNumberPagination):
 )
 @api_view(['GET'])
 def category_list(request):
+    cache_key = listing_cache_key('categories', request)
+    etag, last_modified = make_etag(cache_key), get_catalog_last_modified()
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    data = get_cached_listing(cache_key)
+    if data is not None:
+        response = Response(data, status=status.HTTP_200_OK, headers={'X-Cache': 'HIT'})
+        return set_validators(response, etag, last_modified)
+
     categories = Category.objects.all()
     serializer = CategorySerializer(categories, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    set_cached_listing(cache_key, serializer.data)
+    response = Response(serializer.data, status=status.HTTP_200_OK, headers={'X-Cache': 'MISS'})
+    return set_validators(response, etag, last_modified)
 
 # API endpoint to retrieve a paginated list of products with filtering and sorting capabilities
 # Supports:
-# - Search by name/description
-# - Filter by category and price
-# - Sort by price or creation date
-# - Pagination with customizable page size
+# - Full-text search by name/description (results ranked by relevance)
+# - Filter by category, exact price, price range, stock availability and creation date
+# - Optional facet counts (per category and price histogram) for building filter widgets
+# - Sort by price, name or creation date (only index-backed sort keys are accepted)
+# - Pagination with customizable page size, either page numbers or opaque cursors
+#   (cursor mode avoids COUNT(*) and OFFSET so deep pages stay fast)
+# Responses are cached per normalized query and invalidated by any catalog change,
+# stock changes only refresh the stock of the cached rows (stock filters and facets may lag)
+# Supports conditional GET (ETag / Last-Modified derived from the catalog version and the stock shown)
 @swagger_auto_schema(
     method='GET',
     operation_summary='Get Product list with Pagination & Filters',
     operation_description='This endpoint returns a paginated list of products. '
-                          'You can filter by category or price, search by name/description, and sort by price or date.',
+                          'You can filter by category, price or price range, stock and creation date, '
+                          'search by name/description, and sort by price or date. '
+                          'With facets=true the response also contains per-category counts and a price histogram.',
     manual_parameters=[
-        openapi.Parameter('search', openapi.IN_QUERY, description="Search by name or description", type=openapi.TYPE_STRING),
+        openapi.Parameter('search', openapi.IN_QUERY, description="Full-text search by name or description (ranked by relevance)", type=openapi.TYPE_STRING),
         openapi.Parameter('category', openapi.IN_QUERY, description="Filter by category ID", type=openapi.TYPE_INTEGER),
         openapi.Parameter('price', openapi.IN_QUERY, description="Filter by price", type=openapi.TYPE_NUMBER),
-        openapi.Parameter('ordering', openapi.IN_QUERY, description="Sort by price or date (e.g., 'price' or '-created_at')", type=openapi.TYPE_STRING),
+        openapi.Parameter('price_min', openapi.IN_QUERY, description="Minimum price (inclusive)", type=openapi.TYPE_NUMBER),
+        openapi.Parameter('price_max', openapi.IN_QUERY, description="Maximum price (inclusive)", type=openapi.TYPE_NUMBER),
+        openapi.Parameter('in_stock', openapi.IN_QUERY, description="Only products in stock (true) or out of stock (false)", type=openapi.TYPE_BOOLEAN),
+        openapi.Parameter('created_after', openapi.IN_QUERY, description="Only products created at or after this ISO 8601 date/time", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+        openapi.Parameter('facets', openapi.IN_QUERY, description="Include facet counts (categories and price histogram)", type=openapi.TYPE_BOOLEAN),
+        openapi.Parameter('ordering', openapi.IN_QUERY, description="Sort by price, name or date (e.g., 'price' or '-created_at')", type=openapi.TYPE_STRING, enum=PRODUCT_ORDERINGS),
         openapi.Parameter('page', openapi.IN_QUERY, description="Page number for pagination", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of products per page (max 100)", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('pagination', openapi.IN_QUERY, description="Set to 'cursor' for cursor based pagination", type=openapi.TYPE_STRING, enum=['page', 'cursor']),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor taken from the 'next'/'previous' links (cursor pagination)", type=openapi.TYPE_STRING),
+        openapi.Parameter('with_count', openapi.IN_QUERY, description="Include the total count in cursor pagination responses", type=openapi.TYPE_BOOLEAN),
     ],
     responses={200: ProductSerializer(many=True)}
 )
 @api_view(['GET'])
 def product_list(request):
-    # Start with all products
-    products = Product.objects.all()
+    # Serve from the catalog cache when possible with the current stock,
+    # answering with 304 if the client's copy is current
+    cache_key = listing_cache_key('products', request)
+    last_modified = get_catalog_last_modified(stock=True)
+    data = get_cached_listing(cache_key)
+    if data is not None:
+        refresh_stock(data['results'])
+        etag = make_etag(cache_key, *(row['stock'] for row in data['results']))
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        return set_validators(Response(data, headers={'X-Cache': 'HIT'}), etag, last_modified)
 
-    # Apply category filter if specified
-    category = request.GET.get('category')
-    if category:
-        products = products.filter(category__id=category)
-    
-    # Apply price filter if specified
-    price = request.GET.get('price')
-    if price:
-        products = products.filter(price=price)
+    # Apply category, price, stock and date filters and the requested sort order
+    filterset = ProductFilter(request.GET, queryset=Product.objects.all())
+    if not filterset.is_valid():
+        return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+    products = filterset.qs
 
-    # Apply search filter if specified (searches in both name and description)
+    # Apply search filter if specified (uses the search index over name and description)
     search_query = request.GET.get('search')
     if search_query:
-        products = products.filter(name__icontains=search_query) | products.filter(description__icontains=search_query)
+        products = search_products(products, search_query)
 
-    # Apply sorting (default: newest first)
-    ordering = request.GET.get('ordering', '-created_at')
-    products = products.order_by(ordering)
+    # Apply the default sorting if none was requested (most relevant first when searching, otherwise newest first)
+    if not request.GET.get('ordering'):
+        if search_query:
+            products = products.order_by('-search_rank', '-created_at', '-id')
+        else:
+            products = products.order_by('-created_at', '-id')
 
-    # Apply pagination
-    paginator = ProductPagination()
+    # Fetch plain rows for the fast read-only serialization path
+    value_fields = PRODUCT_VALUE_FIELDS + (('search_rank',) if search_query else ())
+    products = products.values(*value_fields)
+
+    # Apply pagination (cursor mode when requested or when following a cursor link)
+    if request.GET.get('pagination') == 'cursor' or 'cursor' in request.GET:
+        paginator = ProductCursorPagination()
+    else:
+        paginator = ProductPagination()
     paginated_products = paginator.paginate_queryset(products, request)
 
-    serializer = ProductSerializer(paginated_products, many=True)
-    return paginator.get_paginated_response(serializer.data)
+    serializer = ProductReadSerializer(paginated_products, many=True)
+    response = paginator.get_paginated_response(serializer.data)
+
+    # Add facet counts over the filtered and searched catalog if requested
+    if request.GET.get('facets', '').lower() in ('1', 'true', 'yes'):
+        response.data['facets'] = build_facets(request.GET, search_query)
+
+    set_cached_listing(cache_key, response.data)
+    etag = make_etag(cache_key, *(row['stock'] for row in response.data['results']))
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    response['X-Cache'] = 'MISS'
+    return set_validators(response, etag, last_modified)
+
+# Maximum number of products that can be requested in one batch lookup
+MAX_BATCH_PRODUCTS = 300
+
+# API endpoint to retrieve a single product
+# Served from the product cache when warm and supports conditional GET
+@swagger_auto_schema(
+    method='GET',
+    operation_summary='Get Product Details',
+    operation_description='This endpoint returns the details of a single product.',
+    responses={
+        status.HTTP_200_OK: ProductSerializer,
+        status.HTTP_404_NOT_FOUND: openapi.Response(
+            description='Product Not Found',
+            examples={'application/json': {'detail': 'Product not found.'}}
+        )
+    }
+)
+@api_view(['GET'])
+def product_detail(request, product_id):
+    product = get_products_by_ids([product_id]).get(product_id)
+    if product is None:
+        return Response({"detail": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    # Orders change stock without moving the catalog version
+    etag = make_etag('product', product_id, get_catalog_version(), product['stock'])
+    last_modified = get_catalog_last_modified(stock=True)
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    return set_validators(Response(product, status=status.HTTP_200_OK), etag, last_modified)
+
+# API endpoint to retrieve many products by id in one request
+# Products are returned in the requested order (duplicates removed), unknown ids are listed in 'missing'.
+# Cached products are served from the product cache, the rest are fetched with a single query.
+@swagger_auto_schema(
+    method='GET',
+    operation_summary='Get Products by IDs',
+    operation_description=f'This endpoint returns up to {MAX_BATCH_PRODUCTS} products by id, in the requested order.',
+    manual_parameters=[
+        openapi.Parameter('ids', openapi.IN_QUERY, description="Comma separated product IDs (e.g. '3,1,7')",
+                          type=openapi.TYPE_STRING, required=True),
+    ],
+    responses={
+        status.HTTP_200_OK: openapi.Response(
+            description='Requested products',
+            examples={'application/json': {'results': [{'id': 3, 'name': 'Sneakers'}], 'missing': [7]}}
+        ),
+        status.HTTP_400_BAD_REQUEST: openapi.Response(
+            description='Invalid Request',
+            examples={'application/json': {'ids': ['Enter a comma separated list of product IDs.']}}
+        )
+    }
+)
+@api_view(['GET'])
+def product_batch(request):
+    # Accept both ?ids=1,2,3 and ?ids=1&ids=2
+    raw_ids = [value for param in request.GET.getlist('ids') for value in param.split(',') if value.strip()]
+    try:
+        product_ids = list(dict.fromkeys(int(value) for value in raw_ids))
+    except ValueError:
+        return Response({"ids": ["Enter a comma separated list of product IDs."]}, status=status.HTTP_400_BAD_REQUEST)
+    if not product_ids:
+        return Response({"ids": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+    if len(product_ids) > MAX_BATCH_PRODUCTS:
+        return Response(
+            {"ids": [f"At most {MAX_BATCH_PRODUCTS} products can be requested at once."]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    products = get_products_by_ids(product_ids)
+    return Response({
+        "results": [products[product_id] for product_id in product_ids if product_id in products],
+        "missing": [product_id for product_id in product_ids if product_id not in products],
+    }, status=status.HTTP_200_OK)
+
+# API endpoint to inspect the catalog cache
+# Only accessible to admin users
+@swagger_auto_schema(
+    method='GET',
+    operation_summary='Catalog Cache Statistics (Admin Only)',
+    operation_description='This endpoint returns the hit/miss counters and current version of the catalog cache.',
+    responses={
+        status.HTTP_200_OK: openapi.Response(
+            description='Cache statistics',
+            examples={'application/json': {'catalog_version': 1718000000000000, 'hits': 120, 'misses': 30, 'hit_rate': 0.8}}
+        ),
+        status.HTTP_403_FORBIDDEN: openapi.Response(
+            description='Not Authorized',
+            examples={'application/json': {'detail': 'You do not have permission to perform this action.'}}
+        )
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cache_stats(request):
+    # Check if user is admin
+    if not request.user.is_staff:
+        return Response(
+            {"detail": "You do not have permission to perform this action."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    return Response(get_cache_stats(), status=status.HTTP_200_OK)
 
 # API endpoint to create a new product
 # Supports multipart form data for image upload
+# (thumbnail/WebP derivatives are generated in the background and exposed as image_variants)
 # Requires category selection from existing categories
+# (the category choices in the API docs are resolved lazily when the schema is generated)
 # Only accessible to admin users
 @swagger_auto_schema(
     method='POST',
@@ -109,19 +285,10 @@ def product_list(request):
             openapi.IN_FORM,
             type=openapi.TYPE_ARRAY,
             items=openapi.Items(type=openapi.TYPE_FILE)
-        ),
-        openapi.Parameter(
-            'category',
-            openapi.IN_FORM,
-            description=(
-                "Select a category by its ID. Available categories:\n"
-                + "\n".join([f"- {c.id}: {c.name}" for c in Category.objects.all()])
-            ),
-            type=openapi.TYPE_INTEGER,
-            enum=[c.id for c in Category.objects.all()]
         )
     ],
     request_body=ProductSerializer,
+    auto_schema=CategoryFormAutoSchema,
     responses={
         status.HTTP_201_CREATED: openapi.Response(
             description='Product Created',
@@ -156,7 +323,7 @@ def add_product(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 # API endpoint to update an existing product
-# Supports partial updates and image upload
+# Supports partial updates and image upload (a new image gets its derivatives regenerated in the background)
 # Only accessible to admin users
 @swagger_auto_schema(
     method='PUT',
@@ -169,20 +336,11 @@ def add_product(request):
             type=openapi.TYPE_ARRAY,
             items=openapi.Items(type=openapi.TYPE_FILE),
             required=False
-        ),
-        openapi.Parameter(
-            'category',
-            openapi.IN_FORM,
-            description=(
-                "Select a category by its ID. Available categories:\n"
-                + "\n".join([f"- {c.id}: {c.name}" for c in Category.objects.all()])
-            ),
-            type=openapi.TYPE_INTEGER,
-            enum=[c.id for c in Category.objects.all()],
-            required=False
         )
     ],
     request_body=ProductSerializer,
+    auto_schema=CategoryFormAutoSchema,
+    category_required=False,
     responses={
         status.HTTP_200_OK: openapi.Response(
             description='Product Updated',
@@ -261,3 +419,104 @@ def delete_product(request, product_id):
     product.delete()
     return Response(status=status.HTTP_204_NO_CONTENT)
 
+
+
+# API endpoint to bulk import products from a CSV or NDJSON file
+# The upload is streamed and upserted in chunked transactions: rows with an id update
+# that product, rows without one create a new product. Invalid rows are reported and skipped.
+# Only accessible to admin users
+@swagger_auto_schema(
+    method='POST',
+    operation_summary='Bulk Import Products (Admin Only)',
+    operation_description='Imports products from a CSV (header row required) or NDJSON file. '
+                          'Columns/keys: id (optional, updates an existing product), name, description, price, stock, category.',
+    manual_parameters=[
+        openapi.Parameter('file', openapi.IN_FORM, type=openapi.TYPE_FILE, required=True, description="CSV or NDJSON file"),
+        openapi.Parameter('file_format', openapi.IN_FORM, type=openapi.TYPE_STRING, enum=list(FILE_FORMATS),
+                          description="File format (default: taken from the file extension)"),
+    ],
+    responses={
+        status.HTTP_200_OK: openapi.Response(
+            description='Import report',
+            examples={'application/json': {'created': 950, 'updated': 40, 'failed': 1,
+                                           'errors': [{'row': 12, 'errors': {'price': ['A valid number is required.']}}]}}
+        ),
+        status.HTTP_403_FORBIDDEN: openapi.Response(
+            description='Not Authorized',
+            examples={'application/json': {'detail': 'You do not have permission to perform this action.'}}
+        ),
+        status.HTTP_400_BAD_REQUEST: openapi.Response(
+            description='Invalid Request',
+            examples={'application/json': {'detail': 'A file is required.'}}
+        )
+    }
+)
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+@permission_classes([IsAuthenticated])
+def import_products_view(request):
+    # Check if user is admin
+    if not request.user.is_staff:
+        return Response(
+            {"detail": "You do not have permission to perform this action."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({"detail": "A file is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    file_format = request.data.get('file_format') or upload.name.rsplit('.', 1)[-1].lower()
+    if file_format == 'jsonl':
+        file_format = 'ndjson'
+
+    try:
+        report = import_products(upload, file_format)
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(report, status=status.HTTP_200_OK)
+
+# API endpoint to export the whole catalog as CSV or NDJSON
+# The response is streamed from a server-side cursor, so memory use does not grow with the catalog
+# Only accessible to admin users
+@swagger_auto_schema(
+    method='GET',
+    operation_summary='Export Products (Admin Only)',
+    operation_description='Streams all products as CSV or NDJSON.',
+    manual_parameters=[
+        openapi.Parameter('file_format', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(FILE_FORMATS),
+                          description="Export format (default: csv)"),
+    ],
+    responses={
+        status.HTTP_200_OK: openapi.Response(description='Streamed CSV or NDJSON file'),
+        status.HTTP_403_FORBIDDEN: openapi.Response(
+            description='Not Authorized',
+            examples={'application/json': {'detail': 'You do not have permission to perform this action.'}}
+        ),
+        status.HTTP_400_BAD_REQUEST: openapi.Response(
+            description='Invalid Request',
+            examples={'application/json': {'detail': "Unsupported format 'xml'. Use one of: csv, ndjson"}}
+        )
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_products_view(request):
+    # Check if user is admin
+    if not request.user.is_staff:
+        return Response(
+            {"detail": "You do not have permission to perform this action."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    file_format = request.GET.get('file_format', 'csv')
+    if file_format not in FILE_FORMATS:
+        return Response(
+            {"detail": f"Unsupported format '{file_format}'. Use one of: {', '.join(FILE_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export_products(file_format), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+    return response
@@ -0,0 +1,29 @@
+from django.db import transaction
+
+from .models import ArchivedTransaction, Transaction
+
+TRANSACTION_FIELDS = ('id', 'user_id', 'amount', 'transaction_type', 'description', 'timestamp')
+
+
+def archive_transactions(older_than, chunk_size=1000):
+    """
+    Move transactions recorded before the cutoff to the archive table in
+    chunks, each copied and deleted in its own transaction (resumable)
+    """
+    archived = 0
+    while True:
+        ids = list(
+            Transaction.objects.filter(timestamp__lt=older_than)
+            .order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        archived += archive_transaction_chunk(ids)
+    return archived
+
+
+@transaction.atomic
+def archive_transaction_chunk(ids):
+    rows = Transaction.objects.filter(id__in=ids).values(*TRANSACTION_FIELDS)
+    ArchivedTransaction.objects.bulk_create([ArchivedTransaction(**row) for row in rows], ignore_conflicts=True)
+    return Transaction.objects.filter(id__in=ids).delete()[0]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -21,6 +23,13 @@ class UserProfile(models.Model):
             self.balance = None
         super().save(*args, **kwargs)
     
+    def _credit(self, amount):
+        # Added in the database so concurrent deposits, refunds and payments are never lost
+        UserProfile.objects.filter(pk=self.pk).update(
+            balance=Coalesce(F('balance'), Value(Decimal('0.00'))) + Decimal(str(amount))
+        )
+        self.refresh_from_db(fields=['balance'])
+    
     def deposit(self, amount):
         """
         Add funds to user balance
@@ -32,11 +41,7 @@ class UserProfile(models.Model):
         if amount <= 0:
             return False
         
-        if self.balance is None:
-            self.balance = Decimal('0.00')
-            
-        self.balance += Decimal(str(amount))
-        self.save()
+        self._credit(amount)
         
         # Create transaction record
         Transaction.objects.create(
@@ -61,9 +66,13 @@ class UserProfile(models.Model):
             
         if self.balance is None or self.balance < amount:
             return False
-            
-        self.balance -= Decimal(str(amount))
-        self.save()
+        
+        # Conditional update so concurrent withdrawals can never overdraw the balance
+        amount = Decimal(str(amount))
+        updated = UserProfile.objects.filter(pk=self.pk, balance__gte=amount).update(balance=F('balance') - amount)
+        if not updated:
+            return False
+        self.refresh_from_db(fields=['balance'])
         
         # Create transaction record
         Transaction.objects.create(
@@ -85,11 +94,7 @@ class UserProfile(models.Model):
         if amount <= 0:
             return False
             
-        if self.balance is None:
-            self.balance = Decimal('0.00')
-            
-        self.balance += Decimal(str(amount))
-        self.save()
+        self._credit(amount)
         
         # Create transaction record
         Transaction.objects.create(
@@ -123,6 +128,28 @@ class Transaction(models.Model):
     def __str__(self):
         return f"{self.transaction_type} - {self.amount} - {self.user.username}"
 
+class ArchivedTransaction(models.Model):
+    """
+    Old transaction moved out of the Transaction table by
+    `manage.py archive_transactions`; keeps the original id and timestamp
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_transactions')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    description = models.CharField(max_length=255, blank=True)
+    timestamp = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', '-timestamp'], name='archived_txn_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.transaction_type} - {self.amount} - {self.user.username} (archived)"
+
 # Signal to create user profile when user is created
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
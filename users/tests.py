@@ -1,3 +1,89 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .archive import archive_transactions
+from .models import ArchivedTransaction, Transaction, UserProfile
+
+
+class DepositIdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('buyer', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def deposit(self, amount, key=None, client=None):
+        headers = {} if key is None else {'HTTP_IDEMPOTENCY_KEY': key}
+        return (client or self.client).post('/users/deposit/', {'amount': amount}, format='json', **headers)
+
+    def balance(self, user=None):
+        return UserProfile.objects.get(user=user or self.user).balance
+
+    def test_retry_with_same_key_is_replayed(self):
+        first = self.deposit('10.00', key='deposit-1')
+        retry = self.deposit('10.00', key='deposit-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((retry.status_code, retry.json()), (200, first.json()))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(self.balance(), Decimal('10.00'))
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+    def test_key_reused_with_different_body_is_rejected(self):
+        self.deposit('10.00', key='deposit-1')
+        self.assertEqual(self.deposit('20.00', key='deposit-1').status_code, 422)
+        self.assertEqual(self.balance(), Decimal('10.00'))
+
+    def test_keys_are_scoped_per_user(self):
+        other = User.objects.create_user('other', password='secret')
+        client = APIClient()
+        client.force_authenticate(other)
+        self.deposit('10.00', key='deposit-1')
+        response = self.deposit('10.00', key='deposit-1', client=client)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(self.balance(other), Decimal('10.00'))
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.deposit('10.00')
+        self.deposit('10.00')
+        self.assertEqual(self.balance(), Decimal('20.00'))
+
+    def test_invalid_key_is_rejected(self):
+        self.assertEqual(self.deposit('10.00', key='').status_code, 400)
+        self.assertEqual(self.deposit('10.00', key='k' * 256).status_code, 400)
+        self.assertEqual(self.balance(), Decimal('0.00'))
+
+    def test_failed_requests_are_stored_too(self):
+        self.assertEqual(self.deposit('-5.00', key='deposit-1').status_code, 400)
+        self.assertEqual(self.deposit('-5.00', key='deposit-1')['Idempotent-Replayed'], 'true')
+
+
+class ArchiveTransactionsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_transaction(self, amount, days_ago):
+        transaction = Transaction.objects.create(user=self.user, amount=amount, transaction_type='DEPOSIT')
+        Transaction.objects.filter(pk=transaction.pk).update(timestamp=timezone.now() - timedelta(days=days_ago))
+        return transaction
+
+    def test_old_transactions_are_moved_and_listed_on_request(self):
+        old = [self.create_transaction(amount, days_ago) for amount, days_ago in ((1, 500), (2, 400))]
+        recent = self.create_transaction(3, 5)
+
+        self.assertEqual(archive_transactions(timezone.now() - timedelta(days=365), chunk_size=1), 2)
+        self.assertEqual(set(ArchivedTransaction.objects.values_list('id', flat=True)), {t.id for t in old})
+        self.assertEqual(list(Transaction.objects.values_list('id', flat=True)), [recent.id])
 
-# Create your tests here.
+        listed = [t['id'] for t in self.client.get('/users/transactions/').json()]
+        self.assertEqual(listed, [recent.id])
+        listed = [t['id'] for t in self.client.get('/users/transactions/', {'include_archived': 'true'}).json()]
+        self.assertEqual(listed, [recent.id, old[1].id, old[0].id])
@@ -1,3 +1,4 @@
+import heapq
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from rest_framework.response import Response
@@ -12,8 +13,9 @@ from .serializers import (
     LogoutSerializer, AdminRegisterSerializer, ChangePasswordSerializer,
     DepositSerializer, TransactionSerializer
 )
-from .models import Transaction
+from .models import Transaction, ArchivedTransaction
 from django.db import transaction
+from MyShop.idempotency import idempotent, IDEMPOTENCY_KEY_PARAMETER
 
 # User Registration Endpoint
 @swagger_auto_schema(
@@ -307,8 +309,10 @@ def delete_account(request):
 @swagger_auto_schema(
     method='POST',
     operation_summary='Deposit Funds',
-    operation_description='This endpoint allows a user to deposit funds to their balance. Admin users cannot deposit funds.',
+    operation_description='This endpoint allows a user to deposit funds to their balance. Admin users cannot deposit funds. '
+                          'Retries sending the same Idempotency-Key get the original response instead of depositing again.',
     request_body=DepositSerializer,
+    manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
     responses={
         status.HTTP_200_OK: openapi.Response(
             description='Funds deposited successfully',
@@ -326,6 +330,7 @@ def delete_account(request):
 )
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('deposit_funds')
 def deposit_funds(request):
     """
     Deposit funds to user balance
@@ -368,6 +373,9 @@ def deposit_funds(request):
     method='GET',
     operation_summary='Get Transaction History',
     operation_description='This endpoint returns the transaction history of the authenticated user.',
+    manual_parameters=[
+        openapi.Parameter('include_archived', openapi.IN_QUERY, description="Also return archived (old) transactions", type=openapi.TYPE_BOOLEAN),
+    ],
     responses={
         status.HTTP_200_OK: TransactionSerializer(many=True),
         status.HTTP_401_UNAUTHORIZED: openapi.Response(
@@ -382,8 +390,12 @@ def transaction_history(request):
     """
     Get user transaction history
     
-    Returns a list of all user transactions (deposits, withdrawals, refunds)
+    Returns a list of all user transactions (deposits, withdrawals, refunds),
+    including archived ones with ?include_archived=true
     """
-    transactions = Transaction.objects.filter(user=request.user)
+    transactions = Transaction.objects.filter(user=request.user).select_related('user')
+    if request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes'):
+        archived = ArchivedTransaction.objects.filter(user=request.user).select_related('user')
+        transactions = list(heapq.merge(transactions, archived, key=lambda t: t.timestamp, reverse=True))
     serializer = TransactionSerializer(transactions, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)